@@ -0,0 +1,281 @@
+import functools
+import json
+from collections import OrderedDict, namedtuple
+
+from flask import Blueprint, make_response, request, Response
+
+from app import db, parse_show_cursor, format_show_cursor
+from cache import cached_page
+from models import Venue, Artist, Show, Genre, venue_genre, artist_genre
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#
+# Read-only projections of venues, artists and shows. `?fields=id,name`
+# selects only those columns in SQL (joins and the genre lookup are skipped
+# unless a field needs them). Responses carry an ETag of their body, so a
+# client sending If-None-Match gets a 304, and they go through the page
+# cache, so a repeated request does not reach the database at all.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# public field name -> column
+VENUE_FIELDS = OrderedDict([
+  ('id', Venue.id),
+  ('name', Venue.name),
+  ('city', Venue.city),
+  ('state', Venue.state),
+  ('address', Venue.address),
+  ('phone', Venue.phone),
+  ('website', Venue.website),
+  ('image_link', Venue.image_link),
+  ('facebook_link', Venue.facebook_link),
+  ('seeking_talent', Venue.seeking_talent),
+  ('seeking_description', Venue.seeking_description),
+  ('past_shows_count', Venue.past_shows_count),
+  ('upcoming_shows_count', Venue.upcoming_shows_count),
+  ('genres', None),
+])
+
+ARTIST_FIELDS = OrderedDict([
+  ('id', Artist.id),
+  ('name', Artist.name),
+  ('city', Artist.city),
+  ('state', Artist.state),
+  ('phone', Artist.phone),
+  ('website', Artist.website),
+  ('image_link', Artist.image_link),
+  ('facebook_link', Artist.facebook_link),
+  ('seeking_venue', Artist.looking_for_venues),
+  ('seeking_description', Artist.looking_for_description),
+  ('past_shows_count', Artist.past_shows_count),
+  ('upcoming_shows_count', Artist.upcoming_shows_count),
+  ('genres', None),
+])
+
+SHOW_FIELDS = OrderedDict([
+  ('id', Show.id),
+  ('start_time', Show.start_time),
+  ('end_time', Show.end_time),
+  ('venue_id', Show.venue_id),
+  ('venue_name', Venue.name),
+  ('venue_image_link', Venue.image_link),
+  ('artist_id', Show.artist_id),
+  ('artist_name', Artist.name),
+  ('artist_image_link', Artist.image_link),
+])
+
+ShowKey = namedtuple('ShowKey', 'id start_time')
+
+GENRE_LINKS = {
+  Venue: (venue_genre, venue_genre.c.venue_id),
+  Artist: (artist_genre, artist_genre.c.artist_id),
+}
+
+
+class APIError(Exception):
+  def __init__(self, message, status=400):
+    super(APIError, self).__init__(message)
+    self.message = message
+    self.status = status
+
+
+def dumps(data):
+  if orjson is not None:
+    return orjson.dumps(data)
+  # Same bytes as orjson: UTF-8 rather than \u escapes, so ETags match.
+  return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=lambda value: value.isoformat()).encode('utf-8')
+
+
+def json_response(data, status=200):
+  return Response(dumps(data), status=status, mimetype='application/json')
+
+
+@bp.errorhandler(APIError)
+def api_error(error):
+  return json_response({'success': False, 'error': error.message}, error.status)
+
+
+def api_view(view):
+  # Outside the page cache, so cached bodies get their ETag checked too.
+  @functools.wraps(view)
+  def wrapper(*args, **kwargs):
+    response = make_response(view(*args, **kwargs))
+    if response.status_code == 200:
+      response.add_etag()
+      response.make_conditional(request)
+    return response
+  return wrapper
+
+
+def requested_fields(available):
+  fields = request.args.get('fields')
+  if not fields:
+    return list(available)
+  names = [name.strip() for name in fields.split(',') if name.strip()]
+  unknown = [name for name in names if name not in available]
+  if unknown:
+    raise APIError('Unknown fields: {}. Available: {}.'.format(', '.join(unknown), ', '.join(available)))
+  return list(OrderedDict.fromkeys(names))
+
+
+def requested_limit():
+  limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+  return min(max(limit, 1), MAX_LIMIT)
+
+
+def genre_names(model, ids):
+  link_table, owner_id = GENRE_LINKS[model]
+  rows = db.session.query(owner_id, Genre.name) \
+    .join(Genre, Genre.id == link_table.c.genre_id) \
+    .filter(owner_id.in_(ids)) \
+    .order_by(Genre.name) \
+    .all()
+  names = dict((entity_id, []) for entity_id in ids)
+  for entity_id, name in rows:
+    names[entity_id].append(name)
+  return names
+
+
+def select_entities(model, available, query_filter=None, limit=None):
+  # Always selects the id, for paging and the genre lookup, but only
+  # returns it when it was asked for.
+  fields = requested_fields(available)
+  columns = [model.id.label('_id')] + [available[name].label(name) for name in fields if available[name] is not None]
+  query = db.session.query(*columns)
+  if query_filter is not None:
+    query = query.filter(query_filter)
+  query = query.order_by(model.id.asc())
+  if limit is not None:
+    query = query.limit(limit)
+  rows = query.all()
+
+  genres = genre_names(model, [row._id for row in rows]) if 'genres' in fields and rows else {}
+  data = []
+  for row in rows:
+    item = OrderedDict()
+    for name in fields:
+      item[name] = genres.get(row._id, []) if name == 'genres' else getattr(row, name)
+    data.append(item)
+  return data, rows
+
+
+def list_entities(model, available):
+  filters = []
+  after = request.args.get('after', type=int)
+  if after:
+    filters.append(model.id > after)
+  for key in ('city', 'state'):
+    if request.args.get(key):
+      filters.append(getattr(model, key) == request.args[key])
+
+  limit = requested_limit()
+  data, rows = select_entities(model, available, db.and_(*filters) if filters else None, limit + 1)
+  next_cursor = None
+  if len(rows) > limit:
+    data = data[:limit]
+    next_cursor = str(rows[limit - 1]._id)
+  return json_response({'success': True, 'data': data, 'next': next_cursor})
+
+
+def get_entity(model, available, entity_id):
+  data, _ = select_entities(model, available, model.id == entity_id)
+  if not data:
+    raise APIError('{} not found.'.format(model.__name__), 404)
+  return json_response({'success': True, 'data': data[0]})
+
+
+def select_shows(query_filter=None, limit=None, after=None):
+  fields = requested_fields(SHOW_FIELDS)
+  columns = [Show.id.label('_id'), Show.start_time.label('_start_time')] + \
+    [SHOW_FIELDS[name].label(name) for name in fields]
+  query = db.session.query(*columns).select_from(Show)
+  if any(name.startswith('venue_') and name != 'venue_id' for name in fields):
+    query = query.join(Venue, Show.venue_id == Venue.id)
+  if any(name.startswith('artist_') and name != 'artist_id' for name in fields):
+    query = query.join(Artist, Show.artist_id == Artist.id)
+  if query_filter is not None:
+    query = query.filter(query_filter)
+  if after:
+    query = query.filter(db.tuple_(Show.start_time, Show.id) > after)
+  query = query.order_by(Show.start_time.asc(), Show.id.asc())
+  if limit is not None:
+    query = query.limit(limit)
+  rows = query.all()
+  return [OrderedDict((name, getattr(row, name)) for name in fields) for row in rows], rows
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@bp.route('/venues')
+@api_view
+@cached_page('venues')
+def api_venues():
+  return list_entities(Venue, VENUE_FIELDS)
+
+@bp.route('/venues/<int:venue_id>')
+@api_view
+@cached_page('venue:{venue_id}')
+def api_venue(venue_id):
+  return get_entity(Venue, VENUE_FIELDS, venue_id)
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@bp.route('/artists')
+@api_view
+@cached_page('artists')
+def api_artists():
+  return list_entities(Artist, ARTIST_FIELDS)
+
+@bp.route('/artists/<int:artist_id>')
+@api_view
+@cached_page('artist:{artist_id}')
+def api_artist(artist_id):
+  return get_entity(Artist, ARTIST_FIELDS, artist_id)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@bp.route('/shows')
+@api_view
+@cached_page('shows')
+def api_shows():
+  after = None
+  if request.args.get('after'):
+    try:
+      after = parse_show_cursor(request.args['after'])
+    except ValueError:
+      raise APIError('Invalid cursor.')
+  filters = []
+  for key in ('venue_id', 'artist_id'):
+    if request.args.get(key, type=int):
+      filters.append(getattr(Show, key) == request.args.get(key, type=int))
+
+  limit = requested_limit()
+  data, rows = select_shows(db.and_(*filters) if filters else None, limit + 1, after)
+  next_cursor = None
+  if len(rows) > limit:
+    data = data[:limit]
+    last = rows[limit - 1]
+    next_cursor = format_show_cursor(ShowKey(last._id, last._start_time))
+  return json_response({'success': True, 'data': data, 'next': next_cursor})
+
+@bp.route('/shows/<int:show_id>')
+@api_view
+@cached_page('shows')
+def api_show(show_id):
+  data, _ = select_shows(Show.id == show_id)
+  if not data:
+    raise APIError('Show not found.', 404)
+  return json_response({'success': True, 'data': data[0]})
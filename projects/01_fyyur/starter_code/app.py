@@ -3,8 +3,7 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
+from datetime import datetime, timedelta
 from flask import(
   Flask, 
   render_template, 
@@ -13,19 +12,18 @@ from flask import(
   flash, 
   redirect, 
   url_for, 
-  jsonify
+  jsonify,
+  stream_with_context
 )
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-#import logging
-from logging import (
-  Formatter, 
-  FileHandler
-)
+from database import PooledSQLAlchemy, pool_stats
+from logs import init_logging
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-import sys
+from sqlalchemy.exc import IntegrityError
+from cache import page_cache, cached_page
+from profiler import query_profiler
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -33,82 +31,173 @@ import sys
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db = PooledSQLAlchemy(app)
 migrate = Migrate(app, db)
+page_cache.init_app(app)
+query_profiler.init_app(app)
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 from models import *
+from counters import count_new_show
+from search import search, invalidate_search_index
+from importer import import_rows
+from bulk import BulkError, parse_ids, clean_values, update_entities, delete_entities
+from feed import recent_venues, recent_artists
+from schedule import show_schedules, conflict_message
+import online_migrations
+online_migrations.init_app(app)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+from formatting import format_datetime, format_datetimes
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def load_show_timeline(show_key, entity_id, counterpart, prefix):
+  # One statement for every show of a venue (or artist), pulling only the
+  # columns of the other side that the detail pages render.
+  shows_rows = db.session.query(
+      Show.start_time,
+      counterpart.id,
+      counterpart.name,
+      counterpart.image_link
+    ).join(counterpart, getattr(Show, prefix + '_id') == counterpart.id) \
+    .filter(show_key == entity_id) \
+    .order_by(Show.start_time.asc()) \
+    .all()
+
+  today = datetime.now()
+  start_times = format_datetimes([show_row.start_time for show_row in shows_rows], 'full')
+  past_shows = []
+  upcoming_shows = []
+  for show_row, start_time in zip(shows_rows, start_times):
+    bucket = upcoming_shows if show_row.start_time > today else past_shows
+    bucket.append({
+      prefix + "_id": show_row.id,
+      prefix + "_name": show_row.name,
+      prefix + "_image_link": show_row.image_link,
+      "start_time": start_time
+    })
+
+  return past_shows, upcoming_shows
+
+def group_venues_by_area(venues_rows):
+  # Rows come ordered by state/city, so each area is a contiguous run.
+  areas = []
+  area = None
+  for venue_row in venues_rows:
+    if area is None or area['city'] != venue_row.city or area['state'] != venue_row.state:
+      area = {
+        "city": venue_row.city,
+        "state": venue_row.state,
+        "venues": []
+      }
+      areas.append(area)
+    area['venues'].append({
+      "id": venue_row.id,
+      "name": venue_row.name,
+      "num_upcoming_shows": venue_row.upcoming_shows_count
+    })
+  return areas
+
+# Past this many tags a write drops the whole page cache instead.
+MAX_PAGE_TAGS = 200
+
+def venue_page_tags(venue_ids):
+  # Cached pages that render these venues: their own pages, the listings and
+  # the page of every artist with a show there.
+  if len(venue_ids) > MAX_PAGE_TAGS:
+    return ['pages']
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id.in_(venue_ids)) \
+    .distinct().limit(MAX_PAGE_TAGS + 1).all()
+  if len(venue_ids) + len(artist_ids) > MAX_PAGE_TAGS:
+    return ['pages']
+  return ['venues', 'shows'] + ['venue:{}'.format(venue_id) for venue_id in venue_ids] + \
+    ['artist:{}'.format(artist_id) for (artist_id,) in artist_ids]
+
+def artist_page_tags(artist_ids):
+  if len(artist_ids) > MAX_PAGE_TAGS:
+    return ['pages']
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id.in_(artist_ids)) \
+    .distinct().limit(MAX_PAGE_TAGS + 1).all()
+  if len(artist_ids) + len(venue_ids) > MAX_PAGE_TAGS:
+    return ['pages']
+  return ['artists', 'shows'] + ['artist:{}'.format(artist_id) for artist_id in artist_ids] + \
+    ['venue:{}'.format(venue_id) for (venue_id,) in venue_ids]
+
+def venues_changed(page_tags):
+  # Called after a venue write has been committed.
+  venue_choices_cache.invalidate()
+  invalidate_search_index(Venue)
+  page_cache.invalidate(*page_tags)
+
+def artists_changed(page_tags):
+  artist_choices_cache.invalidate()
+  invalidate_search_index(Artist)
+  page_cache.invalidate(*page_tags)
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 @app.route('/')
+@cached_page('venues', 'artists')
 def index():
-  recent_artists = Artist.query.with_entities(Artist.id, Artist.name).order_by(Artist.name.asc()).limit(10).all()
-  recent_venues = Venue.query.with_entities(Venue.id, Venue.name).order_by(Venue.name.asc()).limit(10).all()
-
-  return render_template('pages/home.html', artists = recent_artists, venues = recent_venues)
+  return render_template('pages/home.html', artists = recent_artists(), venues = recent_venues())
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cached_page('venues')
 def venues():
 
-  venues_cities = Venue.query.with_entities(Venue.city, Venue.state).group_by(Venue.city, Venue.state).order_by(Venue.state.asc(), Venue.city.asc()).all()
-  data = []
-  today = datetime.now()
-  for venue_city in venues_cities:
-    venue_city_data = {}
-    venue_city_data['city']  = venue_city.city
-    venue_city_data['state'] = venue_city.state
-    venue_city_data['venues'] = []
-    city_venues = Venue.query.with_entities(Venue.id, Venue.name).filter_by(city = venue_city.city).all()
-
-    for city_venue in city_venues:
-      venue_shows = Show.query.filter(Show.venue_id == city_venue.id).filter(Show.start_time > today).all()
-      city_venues_data = {
-        "id": city_venue.id,
-        "name": city_venue.name,
-        "num_upcoming_shows": len(venue_shows)
-      }
-      venue_city_data['venues'].append(city_venues_data)
-    data.append(venue_city_data)
-
+  venues_rows = Venue.query \
+    .with_entities(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count) \
+    .order_by(Venue.state.asc(), Venue.city.asc(), Venue.name.asc()) \
+    .all()
 
+  data = group_venues_by_area(venues_rows)
   return render_template('pages/venues.html', areas=data)
 
+@app.route('/venues/genres/<genre>')
+@cached_page('venues')
+def venues_by_genre(genre):
+
+  # Served by the (genre_id, venue_id) index and the Venue.state index.
+  venues_query = Venue.query \
+    .with_entities(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count) \
+    .join(venue_genre, venue_genre.c.venue_id == Venue.id) \
+    .join(Genre, Genre.id == venue_genre.c.genre_id) \
+    .filter(Genre.name == genre)
+  if request.args.get('state'):
+    venues_query = venues_query.filter(Venue.state == request.args['state'])
+  if request.args.get('upcoming'):
+    venues_query = venues_query.filter(Venue.upcoming_shows_count > 0)
+
+  venues_rows = venues_query.order_by(Venue.state.asc(), Venue.city.asc(), Venue.name.asc()).all()
+  return render_template('pages/venues.html', areas=group_venues_by_area(venues_rows))
+
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
 
   search_term = request.form.get('search_term', '')
-  venue = Venue.query.filter(Venue.name.ilike('%' + search_term + '%')).all()
-  response = {
-    "count": len(venue),
-    "data": venue
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  page = request.form.get('page', 1, type=int)
+  response = search(Venue, search_term, page)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
+@cached_page('venue:{venue_id}')
 def show_venue(venue_id):
 
   venue = Venue.query.get(venue_id)
@@ -116,34 +205,12 @@ def show_venue(venue_id):
   if not venue:
     return not_found_error('Venue not found.')
 
-  today = datetime.now()
-  upcoming_shows_query = Show.query.join(Artist).filter(Show.venue_id == venue.id).filter(Show.start_time > today).all()
-  past_shows_query = Show.query.join(Artist).filter(Show.venue_id == venue.id).filter(Show.start_time < today).all()
-  
-  upcoming_shows_data = []
-  for upcoming_show in upcoming_shows_query:
-    show_data = {
-      "artist_id": upcoming_show.show_artist.id,
-      "artist_name": upcoming_show.show_artist.name,
-      "artist_image_link": upcoming_show.show_artist.image_link,
-      "start_time": upcoming_show.start_time.strftime("%Y/%m/%d, %H:%M:%S")
-    }
-    upcoming_shows_data.append(show_data)
-
-  past_shows_data = []
-  for past_show in past_shows_query:
-    show_data = {
-      "artist_id": past_show.show_artist.id,
-      "artist_name": past_show.show_artist.name,
-      "artist_image_link": past_show.show_artist.image_link,
-      "start_time": past_show.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-    }
-    past_shows_data.append(show_data)
+  past_shows_data, upcoming_shows_data = load_show_timeline(Show.venue_id, venue.id, Artist, 'artist')
 
   data = {
     "id": venue.id,
     "name": venue.name,
-    "genres": venue.genres.split(","),
+    "genres": venue.genres,
     "address": venue.address,
     "city": venue.city,
     "state": venue.state,
@@ -155,8 +222,8 @@ def show_venue(venue_id):
     "image_link": venue.image_link,
     "past_shows": past_shows_data,
     "upcoming_shows": upcoming_shows_data,
-    "past_shows_count": len(past_shows_query),
-    "upcoming_shows_count": len(upcoming_shows_query)
+    "past_shows_count": venue.past_shows_count,
+    "upcoming_shows_count": venue.upcoming_shows_count
   }
 
   return render_template('pages/show_venue.html', venue=data)
@@ -171,26 +238,24 @@ def create_venue_form():
 
 @app.route('/venues/create', methods=['POST'])
 def create_venue_submission():
-  error = False
   form = VenueForm(request.form)
 
   try:
     venue = Venue()
     form.populate_obj(venue)
-    venue.genres = ','.join(map(str, request.form.getlist('genres'))) #Fix genres mapping
+    venue.genres = request.form.getlist('genres')
     db.session.add(venue)
     db.session.commit()
+    venues_changed(['venues'])
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
-  except ValueError as e:
-    error = True
-    print(e)
+  except:
+    app.logger.exception('Could not create venue')
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
     db.session.rollback()
   finally:
     db.session.close()
   
-  if not error:
-    return render_template('pages/home.html', data = Venue)
+  return render_template('pages/home.html', data = Venue)
 
 
 #  Delete Venue
@@ -199,15 +264,22 @@ def create_venue_submission():
 @app.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
 
+  venue = Venue.query.filter_by(id = venue_id).first()
+  if venue is None:
+    return not_found_error('Venue not found.')
+  venue_name = venue.name
+
   try:
-    venue = Venue.query.filter_by(id = venue_id).first()
-    db.session.delete(venue)
+    page_tags = venue_page_tags([venue.id])
+    delete_entities(Venue, [venue.id])
     db.session.commit()
-    flash('Venue ' + venue.name + ' was successfully deleted.')
+    show_schedules.clear()
+    venues_changed(page_tags)
+    flash('Venue ' + venue_name + ' was successfully deleted.')
   except:
-    flash('An error occurred. Venue ' + venue.name + ' could not be deleted.')
+    flash('An error occurred. Venue ' + venue_name + ' could not be deleted.')
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('Could not delete venue %s', venue_id)
   finally:
     db.session.close()
 
@@ -217,6 +289,7 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cached_page('artists')
 def artists():
 
   data = Artist.query.with_entities(Artist.id, Artist.name)
@@ -224,18 +297,33 @@ def artists():
   return render_template('pages/artists.html', artists=data)
 
 
+@app.route('/artists/genres/<genre>')
+@cached_page('artists')
+def artists_by_genre(genre):
+
+  artists_query = Artist.query \
+    .with_entities(Artist.id, Artist.name) \
+    .join(artist_genre, artist_genre.c.artist_id == Artist.id) \
+    .join(Genre, Genre.id == artist_genre.c.genre_id) \
+    .filter(Genre.name == genre)
+  if request.args.get('state'):
+    artists_query = artists_query.filter(Artist.state == request.args['state'])
+  if request.args.get('upcoming'):
+    artists_query = artists_query.filter(Artist.upcoming_shows_count > 0)
+
+  data = artists_query.order_by(Artist.name.asc()).all()
+  return render_template('pages/artists.html', artists=data)
+
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
 
   search_term = request.form.get('search_term', '')
-  artist = Artist.query.filter(Artist.name.ilike('%' + search_term + '%')).all()
-  response = {
-    "count": len(artist),
-    "data": artist
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  page = request.form.get('page', 1, type=int)
+  response = search(Artist, search_term, page)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@cached_page('artist:{artist_id}')
 def show_artist(artist_id):
 
   artist = Artist.query.get(artist_id)
@@ -243,34 +331,12 @@ def show_artist(artist_id):
   if not artist:
     return not_found_error('Artist not found.')
 
-  today = datetime.now()
-  upcoming_shows_query = Show.query.join(Venue).filter(Show.artist_id == artist.id).filter(Show.start_time > today).all()
-  past_shows_query = Show.query.join(Venue).filter(Show.artist_id == artist.id).filter(Show.start_time < today).all()
-  
-  upcoming_shows_data = []
-  for upcoming_show in upcoming_shows_query:
-    show_data = {
-      "venue_id": upcoming_show.show_venue.id,
-      "venue_name": upcoming_show.show_venue.name,
-      "venue_image_link": upcoming_show.show_venue.image_link,
-      "start_time": upcoming_show.start_time.strftime("%Y/%m/%d, %H:%M:%S")
-    }
-    upcoming_shows_data.append(show_data)
-
-  past_shows_data = []
-  for past_show in past_shows_query:
-    show_data = {
-      "venue_id": past_show.show_venue.id,
-      "venue_name": past_show.show_venue.name,
-      "venue_image_link": past_show.show_venue.image_link,
-      "start_time": past_show.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-    }
-    past_shows_data.append(show_data)
+  past_shows_data, upcoming_shows_data = load_show_timeline(Show.artist_id, artist.id, Venue, 'venue')
 
   data = {
     "id": artist.id,
     "name": artist.name,
-    "genres": artist.genres.split(','),
+    "genres": artist.genres,
     "city": artist.city,
     "state": artist.state,
     "phone": artist.phone,
@@ -281,8 +347,8 @@ def show_artist(artist_id):
     "facebook_link": artist.facebook_link,
     "past_shows": past_shows_data,
     "upcoming_shows" : upcoming_shows_data,
-    "past_shows_count": len(past_shows_query),
-    "upcoming_shows_count": len(upcoming_shows_query)
+    "past_shows_count": artist.past_shows_count,
+    "upcoming_shows_count": artist.upcoming_shows_count
   }
 
   return render_template('pages/show_artist.html', artist=data)
@@ -303,7 +369,7 @@ def edit_artist(artist_id):
     city = artist.city,
     state = artist.state,
     phone = artist.phone,
-    genres = artist.genres.split(','),
+    genres = artist.genres,
     facebook_link = artist.facebook_link,
     image_link = artist.image_link,
     website_link = artist.website,
@@ -323,17 +389,19 @@ def edit_artist_submission(artist_id):
     artist.city =   request.form.get('city', '')
     artist.state =  request.form.get('state', '')
     artist.phone =  request.form.get('phone', '')
-    artist.genres = ','.join(map(str, request.form.getlist('genres')))
+    artist.genres = request.form.getlist('genres')
     artist.facebook_link = request.form.get('facebook_link' , '')
     artist.image_link = request.form.get('image_link', '')
     artist.website = request.form.get('website_link', '')
     artist.looking_for_venues = request.form.get('seeking_venue') == 'y'
     artist.looking_for_description = request.form.get('seeking_description', '')
 
+    page_tags = artist_page_tags([artist_id])
     db.session.commit()
+    artists_changed(page_tags)
   except:
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('Could not edit artist %s', artist_id)
   finally:
     db.session.close()
 
@@ -354,7 +422,7 @@ def edit_venue(venue_id):
     state = venue.state,
     address = venue.address,
     phone = venue.phone,
-    genres = venue.genres.split(','),
+    genres = venue.genres,
     facebook_link = venue.facebook_link,
     image_link = venue.image_link,
     website_link = venue.website,
@@ -374,17 +442,19 @@ def edit_venue_submission(venue_id):
     venue.state =     request.form.get('state', '')
     venue.address =   request.form.get('address', '')
     venue.phone =     request.form.get('phone', '')
-    venue.genres =    ','.join(map(str, request.form.getlist('genres')))
+    venue.genres =    request.form.getlist('genres')
     venue.facebook_link = request.form.get('facebook_link', '')
     venue.image_link =    request.form.get('image_link', '')
     venue.website =       request.form.get('website_link', '')
     venue.seeking_talent = request.form.get('seeking_talent') == 'y'
     venue.seeking_description = request.form.get('seeking_description')
 
+    page_tags = venue_page_tags([venue_id])
     db.session.commit()
+    venues_changed(page_tags)
   except:
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('Could not edit venue %s', venue_id)
   finally:
     db.session.close()
 
@@ -400,25 +470,23 @@ def create_artist_form():
 
 @app.route('/artists/create', methods=['POST'])
 def create_artist_submission():
-  error = False
   form = ArtistForm(request.form)
   try:
     artist = Artist()
     form.populate_obj(artist)
-    artist.genres = ','.join(map(str, request.form.getlist('genres'))) #Fix genres mapping
+    artist.genres = request.form.getlist('genres')
     db.session.add(artist)
     db.session.commit()
+    artists_changed(['artists'])
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
-  except ValueError as e:
-    error = True
-    print(e)
+  except:
+    app.logger.exception('Could not create artist')
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
     db.session.rollback()
   finally:
     db.session.close()
 
-  if not error:
-    return render_template('pages/home.html', data = Artist)
+  return render_template('pages/home.html', data = Artist)
 
 
 def create_artist_submission___():
@@ -439,7 +507,7 @@ def create_artist_submission___():
     city =            request.form['city']
     state =           request.form['state']
     phone =           request.form['phone']
-    genres =          ','.join(map(str, request.form.getlist('genres')))
+    genres =          request.form.getlist('genres')
     facebook_link =   request.form['facebook_link']
     image_link =      request.form['image_link']
     website_link =    request.form['website_link']
@@ -467,7 +535,7 @@ def create_artist_submission___():
     error = True
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('Could not create artist')
   finally:
     db.session.close()
 
@@ -480,15 +548,22 @@ def create_artist_submission___():
 
 @app.route('/artists/<artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
+  artist = Artist.query.filter_by(id = artist_id).first()
+  if artist is None:
+    return not_found_error('Artist not found.')
+  artist_name = artist.name
+
   try:
-    artist = Artist.query.filter_by(id = artist_id).first()
-    db.session.delete(artist)
+    page_tags = artist_page_tags([artist.id])
+    delete_entities(Artist, [artist.id])
     db.session.commit()
-    flash('Artist ' + artist.name + ' was successfully deleted.')
+    show_schedules.clear()
+    artists_changed(page_tags)
+    flash('Artist ' + artist_name + ' was successfully deleted.')
   except:
-    flash('An error occurred. Artist ' + artist.name + ' could not be deleted.')
+    flash('An error occurred. Artist ' + artist_name + ' could not be deleted.')
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('Could not delete artist %s', artist_id)
   finally:
     db.session.close()
 
@@ -498,23 +573,83 @@ def delete_artist(artist_id):
 #  Shows
 #  ----------------------------------------------------------------
 
+SHOWS_PER_PAGE = 60
+
+def parse_show_cursor(cursor):
+  # Cursors look like "<start_time isoformat>_<show id>".
+  start_time, _, show_id = cursor.rpartition('_')
+  return datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%S"), int(show_id)
+
+def format_show_cursor(show_row):
+  return '{}_{}'.format(show_row.start_time.strftime("%Y-%m-%dT%H:%M:%S"), show_row.id)
+
+def load_shows_page(after, limit):
+  # Keyset page ordered on (start_time, id): the cost of a page does not
+  # depend on how deep into the listing it is.
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Venue.id.label('venue_id'),
+      Venue.name.label('venue_name'),
+      Artist.id.label('artist_id'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ).join(Artist, Show.artist_id == Artist.id) \
+    .join(Venue, Show.venue_id == Venue.id)
+  if after:
+    query = query.filter(db.tuple_(Show.start_time, Show.id) > after)
+  return query.order_by(Show.start_time.asc(), Show.id.asc()).limit(limit).all()
+
+def shows_data(shows_rows):
+  start_times = format_datetimes([show_row.start_time for show_row in shows_rows], 'full')
+  return [{
+    "venue_id": show_row.venue_id,
+    "venue_name": show_row.venue_name,
+    "artist_id": show_row.artist_id,
+    "artist_name": show_row.artist_name,
+    "artist_image_link": show_row.artist_image_link,
+    "start_time": start_time
+  } for show_row, start_time in zip(shows_rows, start_times)]
+
+def iter_shows(after, batch_size):
+  while True:
+    shows_rows = load_shows_page(after, batch_size)
+    for show_data in shows_data(shows_rows):
+      yield show_data
+    if len(shows_rows) < batch_size:
+      return
+    after = (shows_rows[-1].start_time, shows_rows[-1].id)
+
 @app.route('/shows')
+@cached_page('shows')
 def shows():
 
-  data = []
-  shows = Show.query.join(Artist).join(Venue).all()
-  for show in shows:
-    show_data = {
-      "venue_id": show.show_venue.id,
-      "venue_name": show.show_venue.name,
-      "artist_id": show.show_artist.id,
-      "artist_name": show.show_artist.name,
-      "artist_image_link": show.show_artist.image_link,
-      "start_time": show.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-    }
-    data.append(show_data)
-
-  return render_template('pages/shows.html', shows=data)
+  after = None
+  if request.args.get('after'):
+    try:
+      after = parse_show_cursor(request.args['after'])
+    except ValueError:
+      return bad_request_error('Invalid cursor.')
+  limit = min(max(request.args.get('limit', SHOWS_PER_PAGE, type=int), 1), 500)
+
+  if request.args.get('stream'):
+    # Render the whole listing chunk by chunk; only one batch of rows is held
+    # in memory at a time.
+    context = {'shows': iter_shows(after, limit), 'next_cursor': None}
+    app.update_template_context(context)
+    template = app.jinja_env.get_template('pages/shows.html')
+    stream = template.stream(context)
+    stream.enable_buffering(limit)
+    return Response(stream_with_context(stream))
+
+  shows_rows = load_shows_page(after, limit + 1)
+  next_cursor = None
+  if len(shows_rows) > limit:
+    shows_rows = shows_rows[:limit]
+    next_cursor = format_show_cursor(shows_rows[-1])
+
+  data = shows_data(shows_rows)
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor, limit=limit)
 
 @app.route('/shows/create')
 def create_shows():
@@ -522,24 +657,190 @@ def create_shows():
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
+# SQLSTATE of a Postgres exclusion constraint violation.
+EXCLUSION_VIOLATION = '23P01'
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   form = ShowForm()
+  if not form.validate():
+    flash('Show could not be listed. ' + ' '.join(
+      '{}: {}'.format(name, ' '.join(errors)) for name, errors in form.errors.items()))
+    return render_template('forms/new_show.html', form = form), 400
+
   try:
     show = Show()
     form.populate_obj(show)
+    show.end_time = form.end_time()
+    conflict = show_schedules.conflict(show.venue_id, show.artist_id, show.start_time, show.end_time)
+    if conflict:
+      flash('Show could not be listed. ' + conflict_message(*conflict))
+      return render_template('forms/new_show.html', form = form), 409
+
     db.session.add(show)
+    count_new_show(show)
+    db.session.flush()
+    booking = (show.id, show.venue_id, show.artist_id, show.start_time, show.end_time)
     db.session.commit()
+    show_schedules.add(*booking)
+    page_cache.invalidate('shows', 'venues', 'artists', 'venue:{}'.format(booking[1]), 'artist:{}'.format(booking[2]))
     flash('Show was successfully listed!')
+  except IntegrityError as e:
+    db.session.rollback()
+    if getattr(e.orig, 'pgcode', None) != EXCLUSION_VIOLATION:
+      flash('An error occurred. Show could not be listed.')
+      app.logger.exception('Could not create show')
+      return render_template('pages/home.html')
+    # Booked by another worker since the schedules here were loaded.
+    show_schedules.discard(form.venue_id.data, form.artist_id.data)
+    flash('Show could not be listed. The venue or the artist is already booked at that time.')
+    return render_template('forms/new_show.html', form = form), 409
   except:
     flash('An error occurred. Show could not be listed.')
     db.session.rollback()
-    print(sys.exc_info())
+    app.logger.exception('Could not create show')
   finally:
     db.session.close()
     
   return render_template('pages/home.html')
 
+MAX_OPEN_SLOTS_RANGE = timedelta(days = 90)
+
+def parse_slot_time(value):
+  # Naive, like the stored show times; None when the argument is absent.
+  if not value:
+    return None
+  parsed = datetime.fromisoformat(value)
+  if parsed.tzinfo is not None:
+    raise ValueError('timezone given')
+  return parsed
+
+@app.route('/venues/<int:venue_id>/open-slots')
+def venue_open_slots(venue_id):
+  # Free periods of at least `min_minutes` between `start` and `end`
+  # (ISO 8601 without a timezone, by default the next seven days).
+  try:
+    start_time = parse_slot_time(request.args.get('start')) or datetime.now().replace(second = 0, microsecond = 0)
+    end_time = parse_slot_time(request.args.get('end')) or start_time + timedelta(days = 7)
+    in_range = start_time < end_time <= start_time + MAX_OPEN_SLOTS_RANGE
+  except (ValueError, OverflowError):
+    return jsonify({'success': False, 'error': 'start and end must be ISO 8601 date-times without a timezone.'}), 400
+  if not in_range:
+    return jsonify({'success': False, 'error': 'end must be after start, by at most 90 days.'}), 400
+  min_minutes = request.args.get('min_minutes', 60, type = int)
+  min_length = timedelta(minutes = min(max(min_minutes, 1), MAX_OPEN_SLOTS_RANGE.days * 24 * 60))
+
+  if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+    return jsonify({'success': False, 'error': 'Venue not found.'}), 404
+  slots = show_schedules.open_slots('venue', venue_id, start_time, end_time, min_length)
+  return jsonify({
+    'success': True,
+    'venue_id': venue_id,
+    'slots': [{'start_time': start.isoformat(), 'end_time': end.isoformat()} for start, end in slots]
+  })
+
+#  Import
+#  ----------------------------------------------------------------
+
+@app.route('/import/<kind>', methods=['POST'])
+def import_data(kind):
+  if kind not in ('venues', 'artists', 'shows'):
+    return not_found_error('Unknown import kind.')
+
+  upload = request.files.get('file')
+  if upload is None:
+    return jsonify({'success': False, 'error': 'A file upload is required.'}), 400
+  fmt = request.form.get('format') or ('jsonl' if upload.filename.endswith(('.jsonl', '.json')) else 'csv')
+  if fmt not in ('csv', 'jsonl'):
+    return jsonify({'success': False, 'error': 'Unknown format.'}), 400
+
+  report = import_rows(kind, upload.stream, fmt)
+  report['success'] = not report['failed']
+  return jsonify(report)
+
+#  Bulk edit and delete
+#  ----------------------------------------------------------------
+
+def bulk_request(model, page_tags, changed, action):
+  # Body: {"ids": [...], "values": {...}}; values only for edits.
+  payload = request.get_json(silent=True) or {}
+  try:
+    ids = parse_ids(payload.get('ids'))
+    values = clean_values(model, payload.get('values')) if action == 'edit' else None
+  except BulkError as e:
+    body = {'success': False, 'error': str(e)}
+    if e.errors:
+      body['errors'] = e.errors
+    return jsonify(body), 400
+
+  try:
+    tags = page_tags(ids)
+    if action == 'edit':
+      count = len(update_entities(model, ids, values))
+    else:
+      count = delete_entities(model, ids)
+    db.session.commit()
+  except:
+    db.session.rollback()
+    app.logger.exception('Bulk %s of %d %s rows failed', action, len(ids), model.__name__)
+    return jsonify({'success': False, 'error': 'The changes could not be saved.'}), 500
+  finally:
+    db.session.close()
+
+  if action == 'delete':
+    # The deleted rows' shows went with them, on both sides.
+    show_schedules.clear()
+  changed(tags)
+  return jsonify({'success': True, ('updated' if action == 'edit' else 'deleted'): count})
+
+@app.route('/venues/bulk-edit', methods=['POST'])
+def bulk_edit_venues():
+  return bulk_request(Venue, venue_page_tags, venues_changed, 'edit')
+
+@app.route('/venues/bulk-delete', methods=['POST'])
+def bulk_delete_venues():
+  return bulk_request(Venue, venue_page_tags, venues_changed, 'delete')
+
+@app.route('/artists/bulk-edit', methods=['POST'])
+def bulk_edit_artists():
+  return bulk_request(Artist, artist_page_tags, artists_changed, 'edit')
+
+@app.route('/artists/bulk-delete', methods=['POST'])
+def bulk_delete_artists():
+  return bulk_request(Artist, artist_page_tags, artists_changed, 'delete')
+
+#  API
+#  ----------------------------------------------------------------
+
+import api
+app.register_blueprint(api.bp)
+
+#  Debug
+#  ----------------------------------------------------------------
+
+@app.route('/_debug/cache')
+def debug_cache():
+  if not app.config.get('DEBUG_ENDPOINTS'):
+    return not_found_error()
+  return jsonify(page_cache.stats())
+
+@app.route('/_debug/pool')
+def debug_pool():
+  # Stats of the worker process that served this request.
+  if not app.config.get('DEBUG_ENDPOINTS'):
+    return not_found_error()
+  return jsonify(pool_stats(db))
+
+@app.route('/_debug/queries')
+def debug_queries():
+  if not app.config.get('DEBUG_ENDPOINTS'):
+    return not_found_error()
+  return jsonify({
+    'enabled': query_profiler.enabled,
+    'repeat_threshold': query_profiler.threshold,
+    'requests': query_profiler.recent()
+  })
+
 @app.errorhandler(404)
 def not_found_error(error = ''):
     return render_template('errors/404.html', error = error), 404
@@ -558,14 +859,8 @@ def invalid_method_error(error = 'Invalid method...'):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    init_logging(app)
+    app.logger.info('Fyyur started')
 
 #----------------------------------------------------------------------------#
 # Launch.
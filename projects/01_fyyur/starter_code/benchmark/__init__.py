@@ -0,0 +1,11 @@
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#
+#   python -m benchmark generate --shows 100000 --reset
+#   python -m benchmark run --output before.json
+#   python -m benchmark compare before.json after.json
+#
+# generate fills a scratch database with seeded synthetic venues, artists and
+# shows; run replays a fixed route mix and reports per-route latency, queries
+# and memory as JSON; compare diffs two reports.
+#----------------------------------------------------------------------------#
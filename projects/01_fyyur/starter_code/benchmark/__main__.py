@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import sys
+
+
+def parse_args(argv):
+  parser = argparse.ArgumentParser(prog='python -m benchmark', description='Fyyur benchmarks.')
+  parser.add_argument('--database-url', default=os.environ.get('FYYUR_BENCHMARK_DATABASE_URL'),
+    help='Database to use instead of the one in config.py (default: $FYYUR_BENCHMARK_DATABASE_URL).')
+  commands = parser.add_subparsers(dest='command')
+  commands.required = True
+
+  generate = commands.add_parser('generate', help='Fill the database with synthetic data.')
+  generate.add_argument('--shows', type=int, default=10000, help='1000 to 10000000 (default: 10000).')
+  generate.add_argument('--venues', type=int, default=None, help='Default: one per ten shows.')
+  generate.add_argument('--artists', type=int, default=None, help='Default: one per ten shows.')
+  generate.add_argument('--seed', type=int, default=0)
+  generate.add_argument('--batch-size', type=int, default=10000)
+  generate.add_argument('--reset', action='store_true', help='Delete existing venues, artists and shows first.')
+
+  run = commands.add_parser('run', help='Replay the route mix and write a JSON report.')
+  run.add_argument('--mode', choices=['client', 'server'], default='client',
+    help='In-process test client, or HTTP against local pre-forked workers.')
+  run.add_argument('--requests', type=int, default=2000)
+  run.add_argument('--warmup', type=int, default=50, help='Requests replayed before measuring.')
+  run.add_argument('--seed', type=int, default=0)
+  run.add_argument('--workers', type=int, default=4, help='Server mode only.')
+  run.add_argument('--concurrency', type=int, default=8, help='Server mode only.')
+  run.add_argument('--no-cache', action='store_true', help='Disable the page cache.')
+  run.add_argument('--output', help='Write the report here instead of stdout.')
+
+  compare = commands.add_parser('compare', help='Compare two reports.')
+  compare.add_argument('old')
+  compare.add_argument('new')
+  compare.add_argument('--threshold', type=float, default=None,
+    help='Exit with status 1 when a route p99 regresses by more than this percentage.')
+  return parser.parse_args(argv)
+
+
+def main(argv=None):
+  args = parse_args(argv)
+
+  if args.command == 'compare':
+    from benchmark.replay import compare
+    with open(args.old) as old_file, open(args.new) as new_file:
+      lines, regressed = compare(json.load(old_file), json.load(new_file), args.threshold)
+    print('\n'.join(lines))
+    return 1 if regressed else 0
+
+  from app import app
+  from cache import page_cache
+  if args.database_url:
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+
+  if args.command == 'generate':
+    from benchmark.generate import generate
+
+    def progress(table, done, total):
+      sys.stderr.write('\r{:<8} {:>10}/{}'.format(table, done, total))
+      if done == total:
+        sys.stderr.write('\n')
+
+    with app.app_context():
+      counts = generate(args.shows, args.venues, args.artists, args.seed, args.reset, args.batch_size, progress)
+    print(json.dumps(counts))
+    return 0
+
+  from benchmark.replay import run
+  if args.no_cache:
+    app.config['CACHE_TYPE'] = 'null'
+    page_cache.init_app(app)
+  report = run(args.requests, args.seed, args.mode, args.workers, args.concurrency, args.warmup)
+  output = json.dumps(report, indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, 'w') as output_file:
+      output_file.write(output + '\n')
+  else:
+    print(output)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,194 @@
+import random
+from datetime import datetime, timedelta
+
+from app import db
+from cache import page_cache
+from counters import rebuild_show_counters
+from forms import VenueForm, artist_choices_cache, venue_choices_cache
+from importer import insert_returning_ids
+from models import Venue, Artist, Show, Genre, venue_genre, artist_genre, DEFAULT_SHOW_DURATION
+from search import invalidate_search_index
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#
+# Everything is drawn from one random.Random(seed), so the same arguments
+# always produce the same rows. Rows are inserted with Core statements in
+# batches, one transaction per batch, which keeps memory flat up to the
+# largest scale (10M shows).
+#----------------------------------------------------------------------------#
+
+MIN_SHOWS = 1000
+MAX_SHOWS = 10000000
+BATCH_SIZE = 10000
+
+# Two years of shows centred on now, at most one per venue and artist a day.
+SHOW_DAYS = 2 * 365
+SHOWS_PER_VENUE = 10
+SHOWS_PER_ARTIST = 10
+CITIES_PER_STATE = 20
+
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+STATES = [value for value, _ in VenueForm.state.kwargs['choices']]
+
+NAME_WORDS = [
+  'Blue', 'Golden', 'Velvet', 'Electric', 'Silver', 'Hidden', 'Grand', 'Little',
+  'Northern', 'Lucky', 'Iron', 'Crystal', 'Wild', 'Midnight', 'Painted', 'Rusty'
+]
+VENUE_NOUNS = ['Room', 'Hall', 'Lounge', 'Tavern', 'Theatre', 'Club', 'Garden', 'Cellar', 'Barn', 'Stage']
+ARTIST_NOUNS = ['Foxes', 'Echoes', 'Rivers', 'Saints', 'Wolves', 'Engines', 'Lights', 'Ghosts', 'Kings', 'Birds']
+CITY_PREFIXES = ['Port', 'Lake', 'New', 'East', 'West', 'Fort', 'Mount', 'Glen']
+CITY_SUFFIXES = ['ville', 'ton', 'field', 'wood', 'burg', 'ford', 'dale', 'haven']
+
+
+def batches(count, batch_size):
+  for start in range(0, count, batch_size):
+    yield min(batch_size, count - start)
+
+
+def insert_rows(table, rows):
+  if db.engine.dialect.name == 'postgresql':
+    db.session.execute(table.insert().values(rows))
+  else:
+    db.session.execute(table.insert(), rows)
+
+
+def reset_tables():
+  tables = [Show.__table__, venue_genre, artist_genre, Venue.__table__, Artist.__table__]
+  if db.engine.dialect.name == 'postgresql':
+    db.session.execute('TRUNCATE {} RESTART IDENTITY'.format(
+      ', '.join('"{}"'.format(table.name) for table in tables)))
+  else:
+    for table in tables:
+      db.session.execute(table.delete())
+  db.session.commit()
+
+
+class Generator(object):
+  def __init__(self, seed=0, now=None):
+    self.rng = random.Random(seed)
+    self.now = now or datetime.now().replace(minute=0, second=0, microsecond=0)
+    self.cities = [
+      (self.rng.choice(CITY_PREFIXES) + self.rng.choice(CITY_SUFFIXES), state)
+      for state in STATES for _ in range(CITIES_PER_STATE)
+    ]
+
+  def name(self, nouns, number):
+    return '{} {} {}'.format(self.rng.choice(NAME_WORDS), self.rng.choice(nouns), number)
+
+  def slug(self, name):
+    return name.lower().replace(' ', '-')
+
+  def venue(self, number):
+    name = 'The ' + self.name(VENUE_NOUNS, number)
+    city, state = self.rng.choice(self.cities)
+    seeking_talent = self.rng.random() < 0.3
+    return {
+      'name': name,
+      'city': city,
+      'state': state,
+      'address': '{} {} St'.format(self.rng.randint(1, 9999), self.rng.choice(NAME_WORDS)),
+      'phone': '{:03d}-{:03d}-{:04d}'.format(self.rng.randint(200, 999), self.rng.randint(0, 999), self.rng.randint(0, 9999)),
+      'website': 'https://www.{}.com'.format(self.slug(name)),
+      'image_link': 'https://images.example.com/venues/{}.jpg'.format(number),
+      'facebook_link': 'https://www.facebook.com/{}'.format(self.slug(name)),
+      'seeking_talent': seeking_talent,
+      'seeking_description': 'Looking for local acts.' if seeking_talent else None
+    }
+
+  def artist(self, number):
+    name = self.name(ARTIST_NOUNS, number)
+    city, state = self.rng.choice(self.cities)
+    looking_for_venues = self.rng.random() < 0.3
+    return {
+      'name': name,
+      'city': city,
+      'state': state,
+      'phone': '{:03d}-{:03d}-{:04d}'.format(self.rng.randint(200, 999), self.rng.randint(0, 999), self.rng.randint(0, 9999)),
+      'website': 'https://www.{}.com'.format(self.slug(name)),
+      'image_link': 'https://images.example.com/artists/{}.jpg'.format(number),
+      'facebook_link': 'https://www.facebook.com/{}'.format(self.slug(name)),
+      'looking_for_venues': looking_for_venues,
+      'looking_for_description': 'Touring next season.' if looking_for_venues else None
+    }
+
+  def genre_ids(self, genre_ids):
+    return self.rng.sample(genre_ids, self.rng.randint(1, 3))
+
+  def plan_shows(self, shows, venues, artists):
+    # Shows are dealt in rounds in which each venue and each artist plays at
+    # most once, and every round gets a day of its own, so no venue or
+    # artist is ever double-booked.
+    self.round_size = min(venues, artists)
+    rounds = -(-shows // self.round_size)
+    if rounds > SHOW_DAYS:
+      raise ValueError('{} shows need at least {} venues and artists'.format(shows, -(-shows // SHOW_DAYS)))
+    self.round_days = self.rng.sample(range(-SHOW_DAYS // 2, SHOW_DAYS // 2), rounds)
+    self.round_offsets = [(self.rng.randrange(venues), self.rng.randrange(artists)) for _ in range(rounds)]
+
+  def show(self, number, venue_ids, artist_ids):
+    round_number, position = divmod(number, self.round_size)
+    venue_offset, artist_offset = self.round_offsets[round_number]
+    # On the hour, ending before the next day starts.
+    start_time = self.now + timedelta(days=self.round_days[round_number], hours=self.rng.randint(0, 21))
+    return {
+      'venue_id': venue_ids[(position + venue_offset) % len(venue_ids)],
+      'artist_id': artist_ids[(position + artist_offset) % len(artist_ids)],
+      'start_time': start_time,
+      'end_time': start_time + DEFAULT_SHOW_DURATION
+    }
+
+
+def generate(shows, venues=None, artists=None, seed=0, reset=False, batch_size=BATCH_SIZE, progress=None):
+  '''
+  Inserts `shows` shows spread over `venues` venues and `artists` artists
+  (by default one venue and one artist per ten shows). Returns the counts.
+  '''
+  if not MIN_SHOWS <= shows <= MAX_SHOWS:
+    raise ValueError('shows must be between {} and {}'.format(MIN_SHOWS, MAX_SHOWS))
+  venues = venues or max(shows // SHOWS_PER_VENUE, 1)
+  artists = artists or max(shows // SHOWS_PER_ARTIST, 1)
+  progress = progress or (lambda table, done, total: None)
+  generator = Generator(seed)
+  generator.plan_shows(shows, venues, artists)
+
+  if reset:
+    reset_tables()
+  genres = Genre.get_or_create_all(GENRES)
+  db.session.commit()
+  genre_ids = [genre.id for genre in genres]
+
+  owner_ids = {}
+  for model, link_table, owner_key, total, make_row in (
+      (Venue, venue_genre, 'venue_id', venues, generator.venue),
+      (Artist, artist_genre, 'artist_id', artists, generator.artist)):
+    ids = owner_ids[model] = []
+    for size in batches(total, batch_size):
+      rows = [make_row(len(ids) + number + 1) for number in range(size)]
+      batch_ids = insert_returning_ids(model.__table__, rows)
+      insert_rows(link_table, [
+        {owner_key: owner_id, 'genre_id': genre_id}
+        for owner_id in batch_ids for genre_id in generator.genre_ids(genre_ids)
+      ])
+      db.session.commit()
+      ids.extend(batch_ids)
+      progress(model.__tablename__, len(ids), total)
+
+  done = 0
+  for size in batches(shows, batch_size):
+    insert_rows(Show.__table__, [generator.show(done + number, owner_ids[Venue], owner_ids[Artist]) for number in range(size)])
+    db.session.commit()
+    done += size
+    progress(Show.__tablename__, done, shows)
+
+  rebuild_show_counters()
+  venue_choices_cache.invalidate()
+  artist_choices_cache.invalidate()
+  invalidate_search_index(Venue)
+  invalidate_search_index(Artist)
+  page_cache.invalidate('pages')
+  if db.engine.dialect.name == 'postgresql':
+    db.session.execute('ANALYZE')
+    db.session.commit()
+
+  return {'venues': venues, 'artists': artists, 'shows': shows}
@@ -0,0 +1,313 @@
+import math
+import multiprocessing
+import platform
+import random
+import resource
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from app import app, db
+from models import Venue, Artist, Show
+from benchmark.generate import GENRES, NAME_WORDS, VENUE_NOUNS, ARTIST_NOUNS
+
+#----------------------------------------------------------------------------#
+# Route replay.
+#
+# A seeded plan of requests following ROUTE_MIX is replayed either in process
+# through the test client, or over HTTP against a local pre-forked WSGI
+# server. Both paths read the per-request query count and worker RSS from
+# response headers added by instrument(), so their reports are comparable.
+#----------------------------------------------------------------------------#
+
+# route name -> relative weight
+ROUTE_MIX = (
+  ('home', 10),
+  ('venues', 15),
+  ('venue', 20),
+  ('artist', 20),
+  ('shows', 10),
+  ('search_venues', 10),
+  ('search_artists', 10),
+  ('create_show', 5),
+)
+
+QUERIES_HEADER = 'X-Benchmark-Queries'
+RSS_HEADER = 'X-Benchmark-RSS-KB'
+
+_request_stats = threading.local()
+
+
+def current_rss_kb():
+  try:
+    with open('/proc/self/statm') as statm:
+      return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+  except (OSError, ValueError, IndexError):
+    # Peak rather than current RSS, but still an upper bound.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+  _request_stats.queries = getattr(_request_stats, 'queries', 0) + 1
+
+
+def _reset_query_count():
+  _request_stats.queries = 0
+
+
+def _add_stats_headers(response):
+  response.headers[QUERIES_HEADER] = str(getattr(_request_stats, 'queries', 0))
+  response.headers[RSS_HEADER] = str(current_rss_kb())
+  return response
+
+
+def instrument():
+  # Must run before the first request: Flask refuses new hooks after that in
+  # debug mode.
+  with app.app_context():
+    event.listen(db.engine, 'before_cursor_execute', _count_query)
+  app.before_request(_reset_query_count)
+  app.after_request(_add_stats_headers)
+
+
+def id_range(model):
+  low, high = db.session.query(db.func.min(model.id), db.func.max(model.id)).one()
+  if low is None:
+    raise RuntimeError('No {} rows; run `python -m benchmark generate` first.'.format(model.__tablename__))
+  return low, high
+
+
+def build_plan(count, seed=0):
+  '''
+  Returns `count` (route, method, path, form data) tuples drawn from
+  ROUTE_MIX. The same seed against the same data gives the same plan.
+  '''
+  rng = random.Random(seed)
+  venue_ids = id_range(Venue)
+  artist_ids = id_range(Artist)
+  db.session.remove()
+  now = datetime.now().replace(microsecond=0)
+  names, weights = zip(*ROUTE_MIX)
+
+  def search_term():
+    return rng.choice([rng.choice(NAME_WORDS), rng.choice(VENUE_NOUNS + ARTIST_NOUNS), rng.choice(GENRES)])
+
+  plan = []
+  for route in rng.choices(names, weights, k=count):
+    if route == 'home':
+      plan.append((route, 'GET', '/', None))
+    elif route == 'venues':
+      plan.append((route, 'GET', '/venues', None))
+    elif route == 'venue':
+      plan.append((route, 'GET', '/venues/{}'.format(rng.randint(*venue_ids)), None))
+    elif route == 'artist':
+      plan.append((route, 'GET', '/artists/{}'.format(rng.randint(*artist_ids)), None))
+    elif route == 'shows':
+      plan.append((route, 'GET', '/shows', None))
+    elif route == 'search_venues':
+      plan.append((route, 'POST', '/venues/search', {'search_term': search_term()}))
+    elif route == 'search_artists':
+      plan.append((route, 'POST', '/artists/search', {'search_term': search_term()}))
+    else:
+      start_time = now + timedelta(hours=rng.randint(1, 24 * 365))
+      plan.append((route, 'POST', '/shows/create', {
+        'venue_id': str(rng.randint(*venue_ids)),
+        'artist_id': str(rng.randint(*artist_ids)),
+        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S')
+      }))
+  return plan
+
+
+def sample(route, started, status, headers):
+  return {
+    'route': route,
+    'elapsed': time.perf_counter() - started,
+    'status': status,
+    'queries': int(headers.get(QUERIES_HEADER, 0)),
+    'rss_kb': int(headers.get(RSS_HEADER, 0))
+  }
+
+
+def replay_client(plan, warmup=0):
+  client = app.test_client()
+  samples = []
+  for number, (route, method, path, data) in enumerate(plan):
+    started = time.perf_counter()
+    response = client.open(path, method=method, data=data)
+    response.get_data()
+    if number >= warmup:
+      samples.append(sample(route, started, response.status_code, response.headers))
+  return samples
+
+
+def _serve(fd, host, port):
+  import logging
+  logging.getLogger('werkzeug').setLevel(logging.ERROR)
+  # Connections inherited from the parent are not safe to share.
+  with app.app_context():
+    db.engine.dispose()
+  make_server(host, port, app, fd=fd).serve_forever()
+
+
+def start_workers(workers, host='127.0.0.1'):
+  # Pre-fork: every worker accepts on the same listening socket.
+  listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+  listener.bind((host, 0))
+  listener.listen(128)
+  port = listener.getsockname()[1]
+  with app.app_context():
+    db.engine.dispose()
+
+  context = multiprocessing.get_context('fork')
+  processes = []
+  for _ in range(workers):
+    process = context.Process(target=_serve, args=(listener.fileno(), host, port), daemon=True)
+    process.start()
+    processes.append(process)
+  return listener, processes, 'http://{}:{}'.format(host, port)
+
+
+def stop_workers(listener, processes):
+  for process in processes:
+    process.terminate()
+  for process in processes:
+    process.join()
+  listener.close()
+
+
+def http_request(base_url, route, method, path, data):
+  body = urlencode(data).encode('utf-8') if data is not None else None
+  started = time.perf_counter()
+  try:
+    with urlopen(Request(base_url + path, data=body, method=method), timeout=60) as response:
+      response.read()
+      return sample(route, started, response.status, response.headers)
+  except HTTPError as error:
+    error.read()
+    return sample(route, started, error.code, error.headers)
+  except OSError:
+    return sample(route, started, 0, {})
+
+
+def replay_server(plan, workers=4, concurrency=8, warmup=0):
+  listener, processes, base_url = start_workers(workers)
+  try:
+    with ThreadPoolExecutor(concurrency) as pool:
+      list(pool.map(lambda step: http_request(base_url, *step), plan[:warmup]))
+      return list(pool.map(lambda step: http_request(base_url, *step), plan[warmup:]))
+  finally:
+    stop_workers(listener, processes)
+
+
+def percentile(values, pct):
+  # Nearest-rank percentile.
+  ordered = sorted(values)
+  return ordered[max(int(math.ceil(pct / 100.0 * len(ordered))) - 1, 0)]
+
+
+def summarize(samples):
+  summary = {
+    'requests': len(samples),
+    'errors': sum(1 for item in samples if not 200 <= item['status'] < 400),
+    'p50_ms': None,
+    'p99_ms': None,
+    'mean_ms': None,
+    'queries_per_request': None,
+    'peak_rss_kb': None
+  }
+  if samples:
+    elapsed = [item['elapsed'] * 1000 for item in samples]
+    summary.update({
+      'p50_ms': round(percentile(elapsed, 50), 3),
+      'p99_ms': round(percentile(elapsed, 99), 3),
+      'mean_ms': round(sum(elapsed) / len(elapsed), 3),
+      'queries_per_request': round(sum(item['queries'] for item in samples) / float(len(samples)), 2),
+      'peak_rss_kb': max(item['rss_kb'] for item in samples)
+    })
+  return summary
+
+
+def table_counts():
+  counts = dict(
+    (model.__tablename__, model.query.count()) for model in (Venue, Artist, Show)
+  )
+  db.session.remove()
+  return counts
+
+
+def run(requests=2000, seed=0, mode='client', workers=4, concurrency=8, warmup=50):
+  instrument()
+  with app.app_context():
+    plan = build_plan(warmup + requests, seed)
+    counts = table_counts()
+    dialect = db.engine.dialect.name
+
+  started = time.perf_counter()
+  if mode == 'client':
+    samples = replay_client(plan, warmup)
+  elif mode == 'server':
+    samples = replay_server(plan, workers, concurrency, warmup)
+  else:
+    raise ValueError('Unknown mode: {}'.format(mode))
+  wall_time = time.perf_counter() - started
+
+  by_route = {}
+  for item in samples:
+    by_route.setdefault(item['route'], []).append(item)
+
+  return {
+    'meta': {
+      'created_at': datetime.now().isoformat(),
+      'mode': mode,
+      'seed': seed,
+      'requests': requests,
+      'warmup': warmup,
+      'workers': workers if mode == 'server' else 1,
+      'concurrency': concurrency if mode == 'server' else 1,
+      'database': dialect,
+      'rows': counts,
+      'cache': app.config.get('CACHE_TYPE'),
+      'python': platform.python_version(),
+      'wall_time_s': round(wall_time, 3),
+      'requests_per_s': round(len(samples) / wall_time, 2) if wall_time else None
+    },
+    'total': summarize(samples),
+    'routes': dict((route, summarize(items)) for route, items in sorted(by_route.items()))
+  }
+
+
+def compare(old, new, threshold=None):
+  '''
+  Returns printable lines comparing two run() reports, and whether any
+  route's p99 regressed by more than `threshold` percent.
+  '''
+  def change(before, after):
+    if not before or after is None:
+      return ''
+    return '{:+.1f}%'.format((after - before) * 100.0 / before)
+
+  lines = ['{:<16} {:>28} {:>28} {:>24} {:>28}'.format('route', 'p50 ms', 'p99 ms', 'queries', 'peak rss kb')]
+  regressed = False
+  routes = sorted(set(old['routes']) | set(new['routes']))
+  for route in routes + ['total']:
+    before = old['total'] if route == 'total' else old['routes'].get(route, {})
+    after = new['total'] if route == 'total' else new['routes'].get(route, {})
+    cells = []
+    for key in ('p50_ms', 'p99_ms', 'queries_per_request', 'peak_rss_kb'):
+      cells.append('{} -> {} {}'.format(before.get(key), after.get(key), change(before.get(key), after.get(key))))
+    lines.append('{:<16} {:>28} {:>28} {:>24} {:>28}'.format(route, *cells))
+
+    before_p99, after_p99 = before.get('p99_ms'), after.get('p99_ms')
+    if threshold is not None and before_p99 and after_p99 is not None:
+      if (after_p99 - before_p99) * 100.0 / before_p99 > threshold:
+        regressed = True
+  return lines, regressed
@@ -0,0 +1,158 @@
+from werkzeug.datastructures import MultiDict
+
+from app import db
+from counters import discount_shows
+from forms import VenueForm, ArtistForm
+from models import Venue, Artist, Show, Genre, venue_genre, artist_genre
+
+#----------------------------------------------------------------------------#
+# Bulk edit and delete.
+#
+# Every operation is a handful of set-based statements over the whole id
+# list, run in the caller's transaction. Deletes leave shows and genre links
+# to the database's ON DELETE CASCADE, so nothing is loaded into the session.
+#----------------------------------------------------------------------------#
+
+MAX_BULK_IDS = 10000
+
+# Editable field (named as in the forms) -> column; genres are handled apart.
+EDITABLE_FIELDS = {
+  Venue: {
+    'name': Venue.name,
+    'city': Venue.city,
+    'state': Venue.state,
+    'address': Venue.address,
+    'phone': Venue.phone,
+    'website_link': Venue.website,
+    'image_link': Venue.image_link,
+    'facebook_link': Venue.facebook_link,
+    'seeking_talent': Venue.seeking_talent,
+    'seeking_description': Venue.seeking_description,
+    'genres': None
+  },
+  Artist: {
+    'name': Artist.name,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'website_link': Artist.website,
+    'image_link': Artist.image_link,
+    'facebook_link': Artist.facebook_link,
+    'seeking_venue': Artist.looking_for_venues,
+    'seeking_description': Artist.looking_for_description,
+    'genres': None
+  },
+}
+
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+
+GENRE_LINKS = {
+  Venue: (venue_genre, 'venue_id'),
+  Artist: (artist_genre, 'artist_id'),
+}
+
+SHOW_KEYS = {
+  Venue: Show.venue_id,
+  Artist: Show.artist_id,
+}
+
+GENRES = set(value for value, _ in ArtistForm.genres.kwargs['choices'])
+
+FORMS = {
+  Venue: VenueForm,
+  Artist: ArtistForm,
+}
+
+
+class BulkError(ValueError):
+  def __init__(self, message, errors=None):
+    super(BulkError, self).__init__(message)
+    # {field: [messages]}, as in the import reports.
+    self.errors = errors
+
+
+def parse_ids(raw_ids):
+  if not isinstance(raw_ids, list) or not raw_ids:
+    raise BulkError('ids must be a non-empty list.')
+  if len(raw_ids) > MAX_BULK_IDS:
+    raise BulkError('At most {} ids per request.'.format(MAX_BULK_IDS))
+  try:
+    ids = [int(raw_id) for raw_id in raw_ids]
+  except (TypeError, ValueError):
+    raise BulkError('ids must be integers.')
+  return list(dict.fromkeys(ids))
+
+
+def clean_values(model, values):
+  if not isinstance(values, dict) or not values:
+    raise BulkError('values must be a non-empty object.')
+  editable = EDITABLE_FIELDS[model]
+  unknown = sorted(name for name in values if name not in editable)
+  if unknown:
+    raise BulkError('Fields cannot be edited: {}.'.format(', '.join(unknown)))
+
+  text_fields = []
+  for name, value in values.items():
+    if name in BOOLEAN_FIELDS:
+      if not isinstance(value, bool):
+        raise BulkError('{} must be true or false.'.format(name))
+    elif name == 'genres':
+      if not isinstance(value, list) or not value or not set(value) <= GENRES:
+        raise BulkError('genres must be a non-empty list of known genres.')
+    elif value is not None and not isinstance(value, str):
+      raise BulkError('{} must be a string.'.format(name))
+    else:
+      text_fields.append(name)
+
+  # The rules of the create and edit forms; null counts as left empty.
+  form = FORMS[model](formdata=MultiDict(
+    (name, values[name]) for name in text_fields if values[name] is not None
+  ), meta={'csrf': False})
+  errors = {}
+  for name in text_fields:
+    if not form[name].validate(form):
+      errors[name] = form[name].errors
+  if errors:
+    raise BulkError('Invalid values: {}.'.format(', '.join(sorted(errors))), errors)
+  return values
+
+
+def existing_ids(model, ids):
+  return [entity_id for (entity_id,) in db.session.query(model.id).filter(model.id.in_(ids))]
+
+
+def update_entities(model, ids, values):
+  '''
+  Applies `values` (already cleaned) to every id that exists; returns those
+  ids. Columns are set with one UPDATE, genres are replaced with one DELETE
+  and one multi-row INSERT.
+  '''
+  ids = existing_ids(model, ids)
+  if not ids:
+    return ids
+
+  editable = EDITABLE_FIELDS[model]
+  column_values = dict((editable[name], value) for name, value in values.items() if editable[name] is not None)
+  if column_values:
+    db.session.query(model) \
+      .filter(model.id.in_(ids)) \
+      .update(column_values, synchronize_session=False)
+
+  if 'genres' in values:
+    link_table, owner_key = GENRE_LINKS[model]
+    db.session.execute(link_table.delete().where(link_table.c[owner_key].in_(ids)))
+    genres = Genre.get_or_create_all(values['genres'])
+    db.session.flush()
+    db.session.execute(link_table.insert(), [
+      {owner_key: owner_id, 'genre_id': genre.id} for owner_id in ids for genre in genres
+    ])
+  return ids
+
+
+def delete_entities(model, ids):
+  # Counters of the other side of each show are adjusted before the
+  # database cascades the shows away.
+  discount_shows(SHOW_KEYS[model].in_(ids))
+  return db.session.query(model) \
+    .filter(model.id.in_(ids)) \
+    .delete(synchronize_session=False)
@@ -0,0 +1,226 @@
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from flask import request, session, make_response, Response
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#
+# Rendered GET pages are cached under their full path and tagged with the
+# entities they show ('venues', 'venue:3', ...). Write handlers call
+# invalidate() with the tags they touch. Invalidation bumps a per-tag version
+# token stored in the same backend, so a file backend shared by several
+# worker processes sees every invalidation.
+#----------------------------------------------------------------------------#
+
+class MemoryBackend(object):
+  # Size-bounded LRU with per-entry expiry.
+  def __init__(self, max_entries=1000):
+    self.max_entries = max_entries
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      expires_at, value = entry
+      if expires_at is not None and expires_at < time.time():
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl=None):
+    expires_at = time.time() + ttl if ttl else None
+    with self._lock:
+      self._entries[key] = (expires_at, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+
+class FileBackend(object):
+  # One pickle per key; the oldest files are evicted past max_entries.
+  def __init__(self, directory, max_entries=1000, prune_every=50):
+    self.directory = directory
+    self.max_entries = max_entries
+    self.prune_every = prune_every
+    self._writes = 0
+    self._lock = threading.Lock()
+    os.makedirs(directory, exist_ok=True)
+
+  def _path(self, key):
+    return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+  def get(self, key):
+    path = self._path(key)
+    try:
+      with open(path, 'rb') as cache_file:
+        expires_at, value = pickle.load(cache_file)
+    except (OSError, EOFError, pickle.PickleError):
+      return None
+    if expires_at is not None and expires_at < time.time():
+      self._remove(path)
+      return None
+    os.utime(path, None)
+    return value
+
+  def set(self, key, value, ttl=None):
+    expires_at = time.time() + ttl if ttl else None
+    path = self._path(key)
+    tmp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(tmp_path, 'wb') as cache_file:
+      pickle.dump((expires_at, value), cache_file, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    with self._lock:
+      self._writes += 1
+      prune = self._writes % self.prune_every == 0
+    if prune:
+      self._prune()
+
+  def _prune(self):
+    paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+    if len(paths) <= self.max_entries:
+      return
+    def mtime(path):
+      try:
+        return os.path.getmtime(path)
+      except OSError:
+        return 0
+    paths.sort(key=mtime)
+    for path in paths[:len(paths) - self.max_entries]:
+      self._remove(path)
+
+  def _remove(self, path):
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+  def clear(self):
+    for name in os.listdir(self.directory):
+      self._remove(os.path.join(self.directory, name))
+
+
+class NullBackend(object):
+  def get(self, key):
+    return None
+
+  def set(self, key, value, ttl=None):
+    pass
+
+  def clear(self):
+    pass
+
+
+class PageCache(object):
+  def __init__(self):
+    self.backend = NullBackend()
+    self.default_ttl = None
+    self.enabled = False
+    self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+    self._stats_lock = threading.Lock()
+
+  def init_app(self, app):
+    cache_type = app.config.get('CACHE_TYPE', 'memory')
+    max_entries = app.config.get('CACHE_MAX_ENTRIES', 1000)
+    if cache_type == 'memory':
+      self.backend = MemoryBackend(max_entries)
+    elif cache_type == 'file':
+      self.backend = FileBackend(app.config['CACHE_DIR'], max_entries)
+    elif cache_type == 'null':
+      self.backend = NullBackend()
+    else:
+      raise ValueError('Unknown CACHE_TYPE: {}'.format(cache_type))
+    self.enabled = cache_type != 'null'
+    self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+
+  def _tag_version(self, tag):
+    # A missing version gets a fresh token, so an evicted version can never
+    # match a version recorded by an older entry.
+    version = self.backend.get('tag:' + tag)
+    if version is None:
+      version = uuid.uuid4().hex
+      self.backend.set('tag:' + tag, version)
+    return version
+
+  def invalidate(self, *tags):
+    for tag in tags:
+      self.backend.set('tag:' + tag, uuid.uuid4().hex)
+
+  def get(self, key):
+    entry = self.backend.get('page:' + key)
+    if entry is None:
+      return None
+    tag_versions, value = entry
+    for tag, version in tag_versions.items():
+      if self._tag_version(tag) != version:
+        return None
+    return value
+
+  def tag_versions(self, tags):
+    return dict((tag, self._tag_version(tag)) for tag in tags)
+
+  def set(self, key, value, tag_versions, ttl=None):
+    # tag_versions must be read before the page is rendered: a write that
+    # invalidates a tag during rendering then leaves the entry stale at once.
+    self.backend.set('page:' + key, (tag_versions, value), ttl or self.default_ttl)
+
+  def clear(self):
+    self.backend.clear()
+
+  def record(self, endpoint, hit):
+    with self._stats_lock:
+      self._stats[endpoint]['hits' if hit else 'misses'] += 1
+
+  def stats(self):
+    with self._stats_lock:
+      return dict((endpoint, dict(counts)) for endpoint, counts in self._stats.items())
+
+
+page_cache = PageCache()
+
+
+def cached_page(*tags, **options):
+  '''
+  Caches a GET view's rendered body. Tags are format strings filled from the
+  view arguments, e.g. cached_page('venues', 'venue:{venue_id}').
+  '''
+  ttl = options.get('ttl')
+
+  def decorator(view):
+    @functools.wraps(view)
+    def wrapper(*args, **view_args):
+      # Pages with pending flash messages are user specific.
+      if not page_cache.enabled or request.method != 'GET' or session.get('_flashes'):
+        return view(*args, **view_args)
+
+      key = request.full_path
+      cached = page_cache.get(key)
+      if cached is not None:
+        page_cache.record(request.endpoint, True)
+        body, status, mimetype = cached
+        return Response(body, status=status, mimetype=mimetype)
+
+      page_cache.record(request.endpoint, False)
+      tag_versions = page_cache.tag_versions(['pages'] + [tag.format(**view_args) for tag in tags])
+      response = view(*args, **view_args)
+      rendered = make_response(response)
+      if rendered.status_code == 200 and not rendered.is_streamed:
+        page_cache.set(key, (rendered.get_data(), rendered.status_code, rendered.mimetype), tag_versions, ttl)
+      return rendered
+    return wrapper
+  return decorator
@@ -0,0 +1,139 @@
+from datetime import datetime
+
+import click
+from sqlalchemy.dialects import postgresql
+
+from app import app, db
+from cache import page_cache
+from models import Venue, Artist, Show, ShowCounterCheckpoint, CHECKPOINT_ID
+
+#----------------------------------------------------------------------------#
+# Materialized show counters.
+#
+# Venue and Artist carry past_shows_count / upcoming_shows_count so pages can
+# read them without scanning Show. The counters are exact as of the single
+# ShowCounterCheckpoint.rolled_at instant: a show is "upcoming" while its
+# start_time is after the checkpoint. Writers adjust the counters in their own
+# transaction, and roll_show_counters() moves shows whose start_time has
+# passed from upcoming to past and advances the checkpoint.
+#----------------------------------------------------------------------------#
+
+COUNTED_MODELS = (
+  (Venue, Show.venue_id),
+  (Artist, Show.artist_id),
+)
+
+
+def counters_checkpoint(for_update=False):
+  # Writers that count shows against the checkpoint hold it FOR SHARE until
+  # they commit, so roll_show_counters (FOR UPDATE) waits for their shows
+  # to be committed, and they wait for a roll in progress to move it.
+  query = ShowCounterCheckpoint.query.filter_by(id=CHECKPOINT_ID) \
+    .with_for_update(read=not for_update)
+  checkpoint = query.first()
+  if checkpoint is None:
+    # Only a database made by db.create_all() lacks the row the
+    # show_counters migration inserts.
+    values = {'id': CHECKPOINT_ID, 'rolled_at': datetime.now()}
+    if db.engine.dialect.name == 'postgresql':
+      db.session.execute(postgresql.insert(ShowCounterCheckpoint.__table__).values(**values).on_conflict_do_nothing())
+    else:
+      db.session.execute(ShowCounterCheckpoint.__table__.insert().values(**values))
+    checkpoint = query.one()
+  return checkpoint
+
+
+def count_new_show(show):
+  # Called after db.session.add(show), before the commit.
+  rolled_at = counters_checkpoint().rolled_at
+  if show.start_time > rolled_at:
+    column_name = 'upcoming_shows_count'
+  else:
+    column_name = 'past_shows_count'
+
+  for model, show_key in COUNTED_MODELS:
+    column = getattr(model, column_name)
+    db.session.query(model) \
+      .filter(model.id == getattr(show, show_key.key)) \
+      .update({column: column + 1}, synchronize_session=False)
+
+
+def discount_shows(show_filter):
+  # Called before the shows matching show_filter are deleted, so every venue
+  # and artist they belong to drops them from its counters.
+  rolled_at = counters_checkpoint().rolled_at
+
+  for model, show_key in COUNTED_MODELS:
+    owned = db.and_(show_key == model.id, show_filter)
+    upcoming = db.select([db.func.count(Show.id)]) \
+      .where(db.and_(owned, Show.start_time > rolled_at)).as_scalar()
+    past = db.select([db.func.count(Show.id)]) \
+      .where(db.and_(owned, Show.start_time <= rolled_at)).as_scalar()
+
+    db.session.query(model) \
+      .filter(model.id.in_(db.select([show_key]).where(show_filter))) \
+      .update({
+        model.upcoming_shows_count: model.upcoming_shows_count - upcoming,
+        model.past_shows_count: model.past_shows_count - past
+      }, synchronize_session=False)
+
+
+def roll_show_counters(now=None):
+  checkpoint = counters_checkpoint(for_update=True)
+  since = checkpoint.rolled_at
+  until = now or datetime.now()
+  if until <= since:
+    db.session.rollback()
+    return 0
+
+  window = db.and_(Show.start_time > since, Show.start_time <= until)
+  for model, show_key in COUNTED_MODELS:
+    moved = db.select([db.func.count(Show.id)]) \
+      .where(db.and_(show_key == model.id, window)).as_scalar()
+
+    db.session.query(model) \
+      .filter(model.id.in_(db.select([show_key]).where(window))) \
+      .update({
+        model.upcoming_shows_count: model.upcoming_shows_count - moved,
+        model.past_shows_count: model.past_shows_count + moved
+      }, synchronize_session=False)
+
+  rolled = Show.query.filter(window).count()
+  checkpoint.rolled_at = until
+  db.session.commit()
+  return rolled
+
+
+def rebuild_show_counters(now=None):
+  checkpoint = counters_checkpoint(for_update=True)
+  checkpoint.rolled_at = now or datetime.now()
+
+  for model, show_key in COUNTED_MODELS:
+    upcoming = db.select([db.func.count(Show.id)]) \
+      .where(db.and_(show_key == model.id, Show.start_time > checkpoint.rolled_at)).as_scalar()
+    past = db.select([db.func.count(Show.id)]) \
+      .where(db.and_(show_key == model.id, Show.start_time <= checkpoint.rolled_at)).as_scalar()
+
+    db.session.query(model).update({
+      model.upcoming_shows_count: upcoming,
+      model.past_shows_count: past
+    }, synchronize_session=False)
+
+  db.session.commit()
+
+
+@app.cli.command('roll-show-counters')
+def roll_show_counters_command():
+  '''Move shows that have started since the last run from upcoming to past.'''
+  rolled = roll_show_counters()
+  if rolled:
+    page_cache.invalidate('pages')
+  click.echo('Rolled {} show(s) from upcoming to past.'.format(rolled))
+
+
+@app.cli.command('rebuild-show-counters')
+def rebuild_show_counters_command():
+  '''Recompute every venue and artist counter from the Show table.'''
+  rebuild_show_counters()
+  page_cache.invalidate('pages')
+  click.echo('Show counters rebuilt.')
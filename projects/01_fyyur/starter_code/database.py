@@ -0,0 +1,61 @@
+import os
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+#----------------------------------------------------------------------------#
+# Database engine.
+#
+# Pool settings come from the DB_* config keys (see config.py) and are only
+# applied to Postgres; the SQLite databases used by the benchmarks keep
+# Flask-SQLAlchemy's defaults, but get foreign keys (and so ON DELETE
+# CASCADE) switched on.
+#----------------------------------------------------------------------------#
+
+class PooledSQLAlchemy(SQLAlchemy):
+  def apply_driver_hacks(self, app, sa_url, options):
+    if sa_url.drivername.startswith('postgresql'):
+      options.update({
+        'pool_size': app.config.get('DB_POOL_SIZE', 5),
+        'max_overflow': app.config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': app.config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': app.config.get('DB_POOL_RECYCLE', -1),
+        'pool_pre_ping': app.config.get('DB_POOL_PRE_PING', False)
+      })
+      statement_timeout = app.config.get('DB_STATEMENT_TIMEOUT_MS')
+      if statement_timeout:
+        connect_args = options.setdefault('connect_args', {})
+        connect_args['options'] = '-c statement_timeout={:d}'.format(statement_timeout)
+    super(PooledSQLAlchemy, self).apply_driver_hacks(app, sa_url, options)
+
+  def create_engine(self, sa_url, engine_opts):
+    engine = super(PooledSQLAlchemy, self).create_engine(sa_url, engine_opts)
+    if engine.dialect.name == 'sqlite':
+      event.listen(engine, 'connect', enable_sqlite_foreign_keys)
+    return engine
+
+
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+  cursor = dbapi_connection.cursor()
+  cursor.execute('PRAGMA foreign_keys=ON')
+  cursor.close()
+
+
+def warm_pool(db, connections=None):
+  # Opens up to pool_size connections and returns them to the pool, so the
+  # first requests of a worker don't pay for connecting.
+  pool = db.engine.pool
+  count = connections if connections is not None else getattr(pool, 'size', lambda: 1)()
+  opened = [db.engine.connect() for _ in range(count)]
+  for connection in opened:
+    connection.close()
+  return count
+
+
+def pool_stats(db):
+  pool = db.engine.pool
+  stats = {'pid': os.getpid(), 'pool': pool.__class__.__name__, 'status': pool.status()}
+  for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+    if hasattr(pool, name):
+      stats[name] = getattr(pool, name)()
+  return stats
@@ -0,0 +1,27 @@
+from app import db
+from models import Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Homepage feed.
+#
+# The newest venues and artists, read from the (created_at, id) indexes. The
+# homepage is a cached page tagged 'venues' and 'artists', so these queries
+# only run after a venue or artist write has invalidated it.
+#----------------------------------------------------------------------------#
+
+FEED_SIZE = 10
+
+
+def recent(model, size=FEED_SIZE):
+  return db.session.query(model.id, model.name, model.created_at) \
+    .order_by(model.created_at.desc(), model.id.desc()) \
+    .limit(size) \
+    .all()
+
+
+def recent_venues():
+  return recent(Venue)
+
+
+def recent_artists():
+  return recent(Artist)
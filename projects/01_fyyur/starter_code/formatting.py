@@ -0,0 +1,49 @@
+import functools
+from datetime import datetime
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#
+# Babel re-parses the locale and the pattern on every format_datetime() call;
+# here both are parsed once and reused. Values are expected to be datetime
+# objects straight from the database, strings are only parsed as a fallback.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+DEFAULT_LOCALE = 'en'
+
+
+@functools.lru_cache(maxsize=16)
+def get_locale(identifier):
+  return Locale.parse(identifier)
+
+
+@functools.lru_cache(maxsize=64)
+def get_pattern(format):
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
+@functools.lru_cache(maxsize=4096)
+def _format(value, format, locale):
+  return get_pattern(format).apply(value, get_locale(locale))
+
+
+def format_datetime(value, format='medium', locale=DEFAULT_LOCALE):
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  return _format(value, format, locale)
+
+
+def format_datetimes(values, format='medium', locale=DEFAULT_LOCALE):
+  # Batch variant for list pages: resolves the pattern and locale once.
+  pattern = get_pattern(format)
+  locale = get_locale(locale)
+  return [pattern.apply(value, locale) for value in values]
@@ -0,0 +1,18 @@
+import multiprocessing
+import os
+
+# gunicorn reads this file from the working directory: `gunicorn wsgi:app`.
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', '5000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('WEB_TIMEOUT', '30'))
+
+# Load the app once in the master so workers start from warm templates.
+preload_app = os.environ.get('WSGI_PRELOAD', '1').lower() not in ('0', 'false', 'no', 'off')
+
+
+def post_fork(server, worker):
+  # Each worker opens its own pool before it accepts requests. Without
+  # preloading the app is imported here, in the worker.
+  from wsgi import warm_worker
+  warm_worker()
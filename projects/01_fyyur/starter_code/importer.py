@@ -0,0 +1,344 @@
+import codecs
+import csv
+import json
+import re
+from collections import defaultdict
+
+import click
+from werkzeug.datastructures import MultiDict
+
+from app import app, db
+from cache import page_cache
+from counters import counters_checkpoint
+from forms import VenueForm, ArtistForm, ShowForm, artist_choices_cache, venue_choices_cache
+from models import Venue, Artist, Show, Genre, venue_genre, artist_genre
+from schedule import Schedule, show_schedules, conflict_message
+from search import invalidate_search_index
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Streams CSV or JSON Lines, validates every row with the same WTForms rules
+# as the create pages, and inserts valid rows in batches: one multi-row
+# statement (or executemany) per table per batch, one transaction per batch.
+# A failing row is reported and skipped; a failing batch is rolled back and
+# reported without stopping the import.
+#----------------------------------------------------------------------------#
+
+BATCH_SIZE = 1000
+
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+UNDECODABLE = re.compile('[\udc80-\udcff]')
+
+
+def undecodable(values):
+  # Bytes that are not UTF-8 survive decoding as lone surrogates.
+  return any(isinstance(value, str) and UNDECODABLE.search(value) for value in values)
+
+
+def read_rows(stream, fmt):
+  # stream is a binary file object; yields (row dict, parse error).
+  text = codecs.getreader('utf-8')(stream, errors='surrogateescape')
+  if fmt == 'csv':
+    for row in csv.DictReader(text):
+      if undecodable(row.values()):
+        yield None, 'Invalid UTF-8.'
+      else:
+        yield row, None
+  elif fmt == 'jsonl':
+    for line in text:
+      line = line.strip()
+      if not line:
+        yield None, None
+        continue
+      if undecodable([line]):
+        yield None, 'Invalid UTF-8.'
+        continue
+      try:
+        row = json.loads(line)
+      except ValueError as e:
+        yield None, 'Invalid JSON: {}'.format(e)
+        continue
+      if isinstance(row, dict):
+        yield row, None
+      else:
+        yield None, 'Expected a JSON object, got: {}'.format(line[:100])
+  else:
+    raise ValueError('Unknown import format: {}'.format(fmt))
+
+
+def row_formdata(row):
+  # Raises ValueError for values no form field can take.
+  formdata = MultiDict()
+  for key, value in row.items():
+    if key is None:
+      continue
+    if key == 'genres':
+      if isinstance(value, str):
+        value = value.split(',')
+      if not isinstance(value, (list, type(None))) or not all(isinstance(genre, str) for genre in value or []):
+        raise ValueError('genres must be a comma-separated string or a list of strings.')
+      for genre in value or []:
+        formdata.add(key, genre.strip())
+    elif key in ('seeking_talent', 'seeking_venue'):
+      if str(value).strip().lower() not in FALSE_VALUES and value is not False:
+        formdata.add(key, 'y')
+    elif value is not None:
+      formdata.add(key, str(value))
+  return formdata
+
+
+def form_errors(form):
+  return dict((name, errors) for name, errors in form.errors.items())
+
+
+class NameMap(object):
+  # name -> id for one model, loaded once per import.
+  def __init__(self, model):
+    self.ids = {}
+    self.ambiguous = set()
+    self.choices = model.query.with_entities(model.id, model.name).all()
+    for entity_id, name in self.choices:
+      if name in self.ids:
+        self.ambiguous.add(name)
+      self.ids.setdefault(name, entity_id)
+
+  def resolve(self, row, name_key, id_key):
+    if row.get(id_key) not in (None, ''):
+      return row[id_key], None
+    name = row.get(name_key)
+    if not name:
+      return None, 'Missing {} or {}.'.format(name_key, id_key)
+    if name in self.ambiguous:
+      return None, 'Ambiguous {} name: {}'.format(name_key, name)
+    if name not in self.ids:
+      return None, 'Unknown {}: {}'.format(name_key, name)
+    return self.ids[name], None
+
+
+class Importer(object):
+  def __init__(self, kind, batch_size=BATCH_SIZE):
+    if kind not in ('venues', 'artists', 'shows'):
+      raise ValueError('Unknown import kind: {}'.format(kind))
+    self.kind = kind
+    self.batch_size = batch_size
+    self.imported = 0
+    self.errors = []
+    self._batch = []
+    self._affected = set()
+    if kind == 'shows':
+      self.artists = NameMap(Artist)
+      self.venues = NameMap(Venue)
+      # Schedules of the shows in the current batch, not yet in the database.
+      self._pending = defaultdict(Schedule)
+
+  def run(self, stream, fmt):
+    for number, (row, error) in enumerate(read_rows(stream, fmt), start=1):
+      if error:
+        self.errors.append({'row': number, 'errors': error})
+        continue
+      if row is None:
+        continue
+      values, errors = self.validate(row)
+      if errors:
+        self.errors.append({'row': number, 'errors': errors})
+        continue
+      self._batch.append((number, values))
+      if len(self._batch) >= self.batch_size:
+        self.flush()
+    self.flush()
+    self.invalidate()
+    return {
+      'kind': self.kind,
+      'imported': self.imported,
+      'failed': len(self.errors),
+      'errors': self.errors
+    }
+
+  def validate(self, row):
+    try:
+      formdata = row_formdata(row)
+    except ValueError as e:
+      return None, str(e)
+    if self.kind == 'venues':
+      form = VenueForm(formdata=formdata, meta={'csrf': False})
+      if not form.validate():
+        return None, form_errors(form)
+      return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'address': form.address.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'website': form.website_link.data,
+        'seeking_talent': form.seeking_talent.data,
+        'seeking_description': form.seeking_description.data,
+        'genres': form.genres.data
+      }, None
+
+    if self.kind == 'artists':
+      form = ArtistForm(formdata=formdata, meta={'csrf': False})
+      if not form.validate():
+        return None, form_errors(form)
+      return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'website': form.website_link.data,
+        'looking_for_venues': form.seeking_venue.data,
+        'looking_for_description': form.seeking_description.data,
+        'genres': form.genres.data
+      }, None
+
+    artist_id, artist_error = self.artists.resolve(row, 'artist', 'artist_id')
+    venue_id, venue_error = self.venues.resolve(row, 'venue', 'venue_id')
+    if artist_error or venue_error:
+      return None, [error for error in (artist_error, venue_error) if error]
+    formdata.setlist('artist_id', [str(artist_id)])
+    formdata.setlist('venue_id', [str(venue_id)])
+    form = ShowForm(formdata=formdata, meta={'csrf': False})
+    form.artist_id.choices = self.artists.choices
+    form.venue_id.choices = self.venues.choices
+    if not form.validate():
+      return None, form_errors(form)
+    values = {
+      'artist_id': form.artist_id.data,
+      'venue_id': form.venue_id.data,
+      'start_time': form.start_time.data,
+      'end_time': form.end_time()
+    }
+    conflict = self.booking_conflict(values)
+    if conflict:
+      return None, {'start_time': [conflict_message(*conflict)]}
+    return values, None
+
+  def booking_conflict(self, values):
+    start_time, end_time = values['start_time'], values['end_time']
+    conflict = show_schedules.conflict(values['venue_id'], values['artist_id'], start_time, end_time)
+    if conflict:
+      return conflict
+    owners = (('venue', values['venue_id']), ('artist', values['artist_id']))
+    for owner in owners:
+      booking = self._pending[owner].conflict(start_time, end_time)
+      if booking is not None:
+        return owner[0], booking
+    for owner in owners:
+      self._pending[owner].add(None, start_time, end_time)
+    return None
+
+  def flush(self):
+    if not self._batch:
+      return
+    batch, self._batch = self._batch, []
+    try:
+      if self.kind == 'shows':
+        self.insert_shows([values for _, values in batch])
+      else:
+        self.insert_with_genres([values for _, values in batch])
+      db.session.commit()
+      self.imported += len(batch)
+    except Exception as e:
+      db.session.rollback()
+      message = 'Batch failed: {}'.format(e.__class__.__name__)
+      self.errors.extend({'row': number, 'errors': message} for number, _ in batch)
+      app.logger.exception('Import batch of %s failed', self.kind)
+    if self.kind == 'shows':
+      # Reloaded from the database when the next batch checks them.
+      for _, values in batch:
+        show_schedules.discard(values['venue_id'], values['artist_id'])
+      self._pending.clear()
+
+  def insert_with_genres(self, rows):
+    if self.kind == 'venues':
+      model, link_table, owner_key = Venue, venue_genre, 'venue_id'
+    else:
+      model, link_table, owner_key = Artist, artist_genre, 'artist_id'
+
+    genre_names = [row.pop('genres') for row in rows]
+    ids = insert_returning_ids(model.__table__, rows)
+
+    genres = Genre.get_or_create_all(name for names in genre_names for name in names)
+    db.session.flush()
+    genre_ids = dict((genre.name, genre.id) for genre in genres)
+    links = [
+      {owner_key: owner_id, 'genre_id': genre_ids[name]}
+      for owner_id, names in zip(ids, genre_names)
+      for name in set(names) if name in genre_ids
+    ]
+    if links:
+      db.session.execute(link_table.insert(), links)
+
+  def insert_shows(self, rows):
+    db.session.execute(Show.__table__.insert(), rows)
+
+    # Same counter rules as counters.count_new_show, applied per batch.
+    rolled_at = counters_checkpoint().rolled_at
+    deltas = {'venue_id': defaultdict(lambda: [0, 0]), 'artist_id': defaultdict(lambda: [0, 0])}
+    for row in rows:
+      slot = 0 if row['start_time'] > rolled_at else 1
+      for key, counts in deltas.items():
+        counts[row[key]][slot] += 1
+        self._affected.add((key, row[key]))
+
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+      table = model.__table__
+      statement = table.update() \
+        .where(table.c.id == db.bindparam('owner_id')) \
+        .values(
+          upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('upcoming'),
+          past_shows_count=table.c.past_shows_count + db.bindparam('past')
+        )
+      db.session.execute(statement, [
+        {'owner_id': owner_id, 'upcoming': upcoming, 'past': past}
+        for owner_id, (upcoming, past) in deltas[key].items()
+      ])
+
+  def invalidate(self):
+    if not self.imported:
+      return
+    if self.kind == 'venues':
+      venue_choices_cache.invalidate()
+      invalidate_search_index(Venue)
+      page_cache.invalidate('venues')
+    elif self.kind == 'artists':
+      artist_choices_cache.invalidate()
+      invalidate_search_index(Artist)
+      page_cache.invalidate('artists')
+    else:
+      tags = ['shows', 'venues', 'artists']
+      tags += ['{}:{}'.format(key[:-3], owner_id) for key, owner_id in self._affected]
+      page_cache.invalidate(*tags)
+
+
+def insert_returning_ids(table, rows):
+  if db.engine.dialect.name == 'postgresql':
+    # One multi-row INSERT ... RETURNING per batch.
+    result = db.session.execute(table.insert().values(rows).returning(table.c.id))
+    return [row[0] for row in result]
+  return [db.session.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+
+def import_rows(kind, stream, fmt, batch_size=BATCH_SIZE):
+  return Importer(kind, batch_size).run(stream, fmt)
+
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+  help='Defaults to the file extension.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+def import_data_command(kind, path, fmt, batch_size):
+  '''Bulk import venues, artists or shows from a CSV or JSON Lines file.'''
+  fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+  with open(path, 'rb') as stream:
+    report = import_rows(kind, stream, fmt, batch_size)
+  for error in report['errors']:
+    click.echo('row {}: {}'.format(error['row'], error['errors']), err=True)
+  click.echo('Imported {} {}, {} row(s) failed.'.format(report['imported'], kind, report['failed']))
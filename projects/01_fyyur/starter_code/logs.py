@@ -0,0 +1,281 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+#----------------------------------------------------------------------------#
+# Logging.
+#
+# Request threads never touch the log file: a QueueHandler puts records on a
+# bounded in-memory queue (and drops them if it is full), and a background
+# LogWriter thread drains the queue in batches, writing JSON lines with one
+# write and one flush per batch and rotating the file by size. Request ids
+# and the request line are captured before a record is queued, and repeated
+# identical errors are rate limited.
+#----------------------------------------------------------------------------#
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+
+def current_request_id():
+  if has_request_context():
+    return g.get('request_id')
+  return None
+
+
+def assign_request_id():
+  # Keep an upstream proxy's id so log lines can be joined across services.
+  g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+
+
+def add_request_id_header(response):
+  request_id = current_request_id()
+  if request_id:
+    response.headers[REQUEST_ID_HEADER] = request_id
+  return response
+
+
+class RequestContextFilter(logging.Filter):
+  # Runs in the request thread, where the request is still available.
+  def filter(self, record):
+    if has_request_context():
+      record.request_id = g.get('request_id')
+      record.method = request.method
+      record.path = request.path
+      record.remote_addr = request.remote_addr
+    return True
+
+
+class RateLimitFilter(logging.Filter):
+  '''
+  Lets at most `burst` records with the same logger, level, message template
+  and exception type through per `interval` seconds. The first record let
+  through after a suppressed run carries the number of records it hid.
+  '''
+  def __init__(self, burst=10, interval=60, max_keys=1000):
+    super(RateLimitFilter, self).__init__()
+    self.burst = burst
+    self.interval = interval
+    self.max_keys = max_keys
+    self._windows = OrderedDict()
+    self._lock = threading.Lock()
+
+  def filter(self, record):
+    if record.levelno < logging.WARNING:
+      return True
+    exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+    key = (record.name, record.levelno, str(record.msg), exc_type)
+    now = time.monotonic()
+    with self._lock:
+      window = self._windows.get(key)
+      if window is None or now - window[0] >= self.interval:
+        suppressed = window[2] if window else 0
+        window = [now, 0, 0]
+        self._windows[key] = window
+      else:
+        suppressed = 0
+      self._windows.move_to_end(key)
+      while len(self._windows) > self.max_keys:
+        self._windows.popitem(last=False)
+
+      window[1] += 1
+      if window[1] > self.burst:
+        window[2] += 1
+        return False
+    if suppressed:
+      record.suppressed = suppressed
+    return True
+
+
+class NonBlockingQueueHandler(logging.Handler):
+  '''
+  Queues records for a LogWriter. Formatting of the message and traceback
+  happens here so the record no longer references request objects; the
+  writer does the JSON encoding and the I/O.
+  '''
+  def __init__(self, writer):
+    super(NonBlockingQueueHandler, self).__init__()
+    self.writer = writer
+    self.dropped = 0
+
+  def emit(self, record):
+    try:
+      record.message = record.getMessage()
+      if record.exc_info:
+        record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+      record.msg, record.args, record.exc_info = record.message, None, None
+      self.writer.put(record)
+    except queue.Full:
+      self.dropped += 1
+    except Exception:
+      self.handleError(record)
+
+
+class JSONFormatter(logging.Formatter):
+  FIELDS = ('request_id', 'method', 'path', 'remote_addr', 'suppressed')
+
+  def format(self, record):
+    entry = {
+      'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+      'level': record.levelname,
+      'logger': record.name,
+      'message': record.getMessage(),
+      'module': record.module,
+      'line': record.lineno,
+      'pid': record.process
+    }
+    for field in self.FIELDS:
+      value = getattr(record, field, None)
+      if value is not None:
+        entry[field] = value
+    if record.exc_text:
+      entry['exception'] = record.exc_text
+    return json.dumps(entry, default=str)
+
+
+class LogWriter(object):
+  '''
+  Background thread appending formatted records to `path`. The file is
+  rotated to path.1 ... path.<backup_count> before a batch would take it past
+  `max_bytes`, which caps the logs at about max_bytes * (backup_count + 1).
+  '''
+  def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5,
+               queue_size=10000, batch_size=200, flush_interval=1.0):
+    self.path = os.path.abspath(path)
+    self.max_bytes = max_bytes
+    self.backup_count = backup_count
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.formatter = JSONFormatter()
+    self.queue = queue.Queue(queue_size)
+    self._stream = None
+    self._thread = None
+    self._pid = None
+    self._start_lock = threading.Lock()
+
+  def put(self, record):
+    self._ensure_started()
+    self.queue.put_nowait(record)
+
+  def _ensure_started(self):
+    # Threads do not survive a fork: a pre-forked worker starts its own.
+    if self._pid == os.getpid():
+      return
+    with self._start_lock:
+      if self._pid == os.getpid():
+        return
+      if self._pid is not None:
+        self.queue = queue.Queue(self.queue.maxsize)
+        self._stream = None
+      self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+      self._thread.start()
+      self._pid = os.getpid()
+
+  def _run(self):
+    while True:
+      batch = [self.queue.get()]
+      deadline = time.monotonic() + self.flush_interval
+      while len(batch) < self.batch_size and batch[-1] is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+          break
+        try:
+          batch.append(self.queue.get(timeout=timeout))
+        except queue.Empty:
+          break
+      stop = batch[-1] is None
+      records = [record for record in batch if record is not None]
+      if records:
+        try:
+          self.write(records)
+        except Exception:
+          traceback.print_exc()
+      if stop:
+        return
+
+  def write(self, records):
+    data = ''.join(self.formatter.format(record) + '\n' for record in records).encode('utf-8')
+    stream = self._open()
+    # fstat rather than tell(): other workers append to the same file.
+    size = os.fstat(stream.fileno()).st_size
+    if size and size + len(data) > self.max_bytes:
+      self.rotate()
+      stream = self._open()
+    stream.write(data)
+    stream.flush()
+
+  def _open(self):
+    # Another process may have rotated the file; follow it to the new one.
+    if self._stream is not None:
+      try:
+        if os.stat(self.path).st_ino == os.fstat(self._stream.fileno()).st_ino:
+          return self._stream
+      except OSError:
+        pass
+      self._stream.close()
+    self._stream = open(self.path, 'ab')
+    return self._stream
+
+  def rotate(self):
+    self._stream.close()
+    self._stream = None
+    for number in range(self.backup_count - 1, 0, -1):
+      source = '{}.{}'.format(self.path, number)
+      if os.path.exists(source):
+        os.replace(source, '{}.{}'.format(self.path, number + 1))
+    if self.backup_count:
+      os.replace(self.path, self.path + '.1')
+    else:
+      os.remove(self.path)
+
+  def stop(self, timeout=5):
+    if self._pid != os.getpid() or not self._thread.is_alive():
+      return
+    try:
+      self.queue.put(None, timeout=timeout)
+    except queue.Full:
+      return
+    self._thread.join(timeout)
+
+
+def init_logging(app):
+  '''
+  Sends app.logger (and the werkzeug/sqlalchemy loggers) through one queued
+  JSON file handler, and tags requests with an X-Request-ID.
+  '''
+  app.before_request(assign_request_id)
+  app.after_request(add_request_id_header)
+
+  writer = LogWriter(
+    app.config.get('LOG_FILE', 'error.log'),
+    max_bytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+    backup_count=app.config.get('LOG_BACKUP_COUNT', 5),
+    queue_size=app.config.get('LOG_QUEUE_SIZE', 10000),
+    batch_size=app.config.get('LOG_BATCH_SIZE', 200),
+    flush_interval=app.config.get('LOG_FLUSH_INTERVAL', 1.0)
+  )
+  handler = NonBlockingQueueHandler(writer)
+  handler.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+  handler.addFilter(RequestContextFilter())
+  handler.addFilter(RateLimitFilter(
+    burst=app.config.get('LOG_RATE_LIMIT_BURST', 10),
+    interval=app.config.get('LOG_RATE_LIMIT_INTERVAL', 60)
+  ))
+
+  app.logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+  # Flask's default handler writes to stderr from the request thread.
+  app.logger.removeHandler(default_handler)
+  for logger in (app.logger, logging.getLogger('werkzeug'), logging.getLogger('sqlalchemy')):
+    logger.addHandler(handler)
+  atexit.register(writer.stop)
+  return handler
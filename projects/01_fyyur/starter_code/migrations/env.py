@@ -25,6 +25,13 @@ config.set_main_option(
     str(current_app.extensions['migrate'].db.engine.url).replace('%', '%%'))
 target_metadata = current_app.extensions['migrate'].db.metadata
 
+from online_migrations import PROGRESS_TABLE
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Bookkeeping of online_migrations.backfill(), not part of the models.
+    return not (type_ == 'table' and name == PROGRESS_TABLE)
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -77,6 +84,10 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
+            # A failing revision leaves the ones before it applied, and no
+            # revision holds its locks while the next one runs.
+            transaction_per_migration=True,
             **current_app.extensions['migrate'].configure_args
         )
 
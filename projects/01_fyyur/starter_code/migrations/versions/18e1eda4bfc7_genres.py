@@ -0,0 +1,107 @@
+"""genres
+
+Revision ID: 18e1eda4bfc7
+Revises: c067743db260
+Create Date: 2026-10-18 11:26:05.642971
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '18e1eda4bfc7'
+down_revision = 'c067743db260'
+branch_labels = None
+depends_on = None
+
+# Must stay identical to search.search_document() so the planner matches it.
+SEARCH_DOCUMENT = (
+    "(((COALESCE(name, '') || ' ') || COALESCE(city, '')) || ' ') || COALESCE(state, '')"
+)
+OLD_SEARCH_DOCUMENT = (
+    "(((((COALESCE(name, '') || ' ') || COALESCE(city, '')) || ' ') "
+    "|| COALESCE(state, '')) || ' ') || COALESCE(genres, '')"
+)
+
+OWNERS = (('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id'))
+
+
+def upgrade():
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('VenueGenre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_VenueGenre_genre_id_venue_id', 'VenueGenre', ['genre_id', 'venue_id'], unique=False)
+    op.create_table('ArtistGenre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_ArtistGenre_genre_id_artist_id', 'ArtistGenre', ['genre_id', 'artist_id'], unique=False)
+    op.create_index(op.f('ix_Venue_state'), 'Venue', ['state'], unique=False)
+    op.create_index(op.f('ix_Artist_state'), 'Artist', ['state'], unique=False)
+
+    # Backfill from the comma-joined strings.
+    op.execute('''
+        INSERT INTO "Genre" (name)
+        SELECT DISTINCT trim(g.name) FROM (
+          SELECT unnest(string_to_array(genres, ',')) AS name FROM "Venue"
+          UNION
+          SELECT unnest(string_to_array(genres, ',')) AS name FROM "Artist"
+        ) g
+        WHERE trim(g.name) <> ''
+    ''')
+    for table, link_table, key in OWNERS:
+        op.execute('''
+            INSERT INTO "{link_table}" ({key}, genre_id)
+            SELECT DISTINCT o.id, g.id
+            FROM "{table}" o
+            CROSS JOIN LATERAL unnest(string_to_array(o.genres, ',')) AS t(name)
+            JOIN "Genre" g ON g.name = trim(t.name)
+        '''.format(table=table, link_table=link_table, key=key))
+
+    # Dropping genres also drops the search index built over it; rebuild it
+    # on the remaining columns.
+    for table, _, _ in OWNERS:
+        op.drop_column(table, 'genres')
+        op.execute(
+            'CREATE INDEX "ix_{table}_search_trgm" ON "{table}" '
+            'USING gin (({document}) gin_trgm_ops)'.format(table=table, document=SEARCH_DOCUMENT)
+        )
+
+
+def downgrade():
+    for table, link_table, key in OWNERS:
+        op.drop_index('ix_{}_search_trgm'.format(table), table_name=table)
+        op.add_column(table, sa.Column('genres', sa.String(length=200), nullable=True))
+        op.execute('''
+            UPDATE "{table}" o SET genres = (
+              SELECT string_agg(g.name, ',' ORDER BY g.name)
+              FROM "{link_table}" l JOIN "Genre" g ON g.id = l.genre_id
+              WHERE l.{key} = o.id
+            )
+        '''.format(table=table, link_table=link_table, key=key))
+        op.execute(
+            'CREATE INDEX "ix_{table}_search_trgm" ON "{table}" '
+            'USING gin (({document}) gin_trgm_ops)'.format(table=table, document=OLD_SEARCH_DOCUMENT)
+        )
+
+    op.drop_index(op.f('ix_Artist_state'), table_name='Artist')
+    op.drop_index(op.f('ix_Venue_state'), table_name='Venue')
+    op.drop_index('ix_ArtistGenre_genre_id_artist_id', table_name='ArtistGenre')
+    op.drop_table('ArtistGenre')
+    op.drop_index('ix_VenueGenre_genre_id_venue_id', table_name='VenueGenre')
+    op.drop_table('VenueGenre')
+    op.drop_table('Genre')
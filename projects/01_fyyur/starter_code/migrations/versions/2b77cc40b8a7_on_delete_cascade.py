@@ -0,0 +1,37 @@
+"""on delete cascade
+
+Revision ID: 2b77cc40b8a7
+Revises: e6e537dcc1ee
+Create Date: 2026-10-18 15:02:17.530214
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2b77cc40b8a7'
+down_revision = 'e6e537dcc1ee'
+branch_labels = None
+depends_on = None
+
+# (constraint, table, column, referred table)
+FOREIGN_KEYS = [
+    ('Show_venue_id_fkey', 'Show', 'venue_id', 'Venue'),
+    ('Show_artist_id_fkey', 'Show', 'artist_id', 'Artist'),
+    ('VenueGenre_venue_id_fkey', 'VenueGenre', 'venue_id', 'Venue'),
+    ('ArtistGenre_artist_id_fkey', 'ArtistGenre', 'artist_id', 'Artist'),
+]
+
+
+def upgrade():
+    # Deleting a venue or an artist removes its shows and genre links in the
+    # database instead of loading them into the session first.
+    for name, table, column, referred in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    for name, table, column, referred in FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'])
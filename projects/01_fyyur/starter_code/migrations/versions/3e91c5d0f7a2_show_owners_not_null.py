@@ -0,0 +1,34 @@
+"""show owners not null
+
+Revision ID: 3e91c5d0f7a2
+Revises: a8dcb6230dbd
+Create Date: 2026-10-18 20:02:37.551048
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import set_not_null
+
+
+# revision identifiers, used by Alembic.
+revision = '3e91c5d0f7a2'
+down_revision = 'a8dcb6230dbd'
+branch_labels = None
+depends_on = None
+
+OWNER_COLUMNS = ('venue_id', 'artist_id')
+
+
+def upgrade():
+    # Every writer sets both owners, and a show without one is listed on
+    # no page and escapes the schedule constraints. Any such row left over
+    # from before the forms required both is deleted in batches, after the
+    # check stops new ones from appearing.
+    for column in OWNER_COLUMNS:
+        set_not_null('Show', column, delete=True)
+
+
+def downgrade():
+    for column in OWNER_COLUMNS:
+        op.alter_column('Show', column, existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,55 @@
+"""show counters
+
+Revision ID: 7d35235ac122
+Revises: 7680352f5a31
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d35235ac122'
+down_revision = '7680352f5a31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowCounterCheckpoint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('Artist', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute('UPDATE "Venue" SET past_shows_count = 0 WHERE past_shows_count IS NULL')
+    op.execute('UPDATE "Venue" SET upcoming_shows_count = 0 WHERE upcoming_shows_count IS NULL')
+    op.alter_column('Venue', 'past_shows_count', existing_type=sa.Integer(), server_default='0', nullable=False)
+    op.alter_column('Venue', 'upcoming_shows_count', existing_type=sa.Integer(), server_default='0', nullable=False)
+    op.drop_column('Venue', 'past_shows')
+    op.drop_column('Venue', 'upcoming_shows')
+
+    # Backfill the counters as of now and record that instant as the checkpoint.
+    op.execute('INSERT INTO "ShowCounterCheckpoint" (id, rolled_at) VALUES (1, now())')
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute('''
+            UPDATE "{table}" SET
+              upcoming_shows_count = (
+                SELECT count(*) FROM "Show" s, "ShowCounterCheckpoint" c
+                WHERE s.{key} = "{table}".id AND s.start_time > c.rolled_at),
+              past_shows_count = (
+                SELECT count(*) FROM "Show" s, "ShowCounterCheckpoint" c
+                WHERE s.{key} = "{table}".id AND s.start_time <= c.rolled_at)
+        '''.format(table=table, key=key))
+
+
+def downgrade():
+    op.add_column('Venue', sa.Column('upcoming_shows', sa.String(length=500), nullable=True))
+    op.add_column('Venue', sa.Column('past_shows', sa.String(length=500), nullable=True))
+    op.alter_column('Venue', 'upcoming_shows_count', existing_type=sa.Integer(), server_default=None, nullable=True)
+    op.alter_column('Venue', 'past_shows_count', existing_type=sa.Integer(), server_default=None, nullable=True)
+    op.drop_column('Artist', 'upcoming_shows_count')
+    op.drop_column('Artist', 'past_shows_count')
+    op.drop_table('ShowCounterCheckpoint')
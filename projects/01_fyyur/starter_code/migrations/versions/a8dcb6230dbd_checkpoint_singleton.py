@@ -0,0 +1,28 @@
+"""checkpoint singleton
+
+Revision ID: a8dcb6230dbd
+Revises: b4482fd47475
+Create Date: 2026-10-18 19:20:44.183905
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8dcb6230dbd'
+down_revision = 'b4482fd47475'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the row the show_counters migration inserted (id 1) and drop any
+    # duplicate an unlocked first read may have added.
+    op.execute('DELETE FROM "ShowCounterCheckpoint" WHERE id <> 1')
+    op.execute('INSERT INTO "ShowCounterCheckpoint" (id, rolled_at) '
+               'SELECT 1, now() WHERE NOT EXISTS (SELECT 1 FROM "ShowCounterCheckpoint")')
+    op.create_check_constraint('ShowCounterCheckpoint_singleton', 'ShowCounterCheckpoint', 'id = 1')
+
+
+def downgrade():
+    op.drop_constraint('ShowCounterCheckpoint_singleton', 'ShowCounterCheckpoint')
@@ -0,0 +1,35 @@
+"""created at
+
+Revision ID: ab3da4d1e38d
+Revises: 2b77cc40b8a7
+Create Date: 2026-10-18 16:12:40.318502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ab3da4d1e38d'
+down_revision = '2b77cc40b8a7'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist')
+
+
+def upgrade():
+    for table in TABLES:
+        # Existing rows all get the migration time (now() is evaluated once,
+        # so Postgres does not rewrite the table); ids order them among
+        # themselves. New rows get their timestamp from the model.
+        op.add_column(table, sa.Column('created_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("timezone('utc', now())")))
+        op.alter_column(table, 'created_at', server_default=None)
+        op.create_index('ix_{}_created_at_id'.format(table), table, ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_{}_created_at_id'.format(table), table_name=table)
+        op.drop_column(table, 'created_at')
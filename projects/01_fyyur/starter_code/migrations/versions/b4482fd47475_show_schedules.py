@@ -0,0 +1,54 @@
+"""show schedules
+
+Revision ID: b4482fd47475
+Revises: ab3da4d1e38d
+Create Date: 2026-10-18 17:05:12.604417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4482fd47475'
+down_revision = 'ab3da4d1e38d'
+branch_labels = None
+depends_on = None
+
+OWNER_COLUMNS = ('venue_id', 'artist_id')
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # Existing shows last the default two hours, cut short where the next
+    # show of the same venue or artist starts earlier, so the constraints
+    # below hold for the data already there.
+    op.execute('''
+        UPDATE "Show" AS show SET end_time = LEAST(
+            show.start_time + interval '2 hours', next.venue_start, next.artist_start)
+        FROM (
+            SELECT id,
+                lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS venue_start,
+                lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS artist_start
+            FROM "Show"
+        ) AS next
+        WHERE next.id = show.id
+    ''')
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.create_check_constraint('Show_end_time_check', 'Show', 'end_time >= start_time')
+
+    # int4range(id, id, '[]') WITH = compares the owner through the range
+    # GiST operator class, which avoids depending on btree_gist.
+    for column in OWNER_COLUMNS:
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT "Show_{column}_during_excl" EXCLUDE USING gist ('
+            "int4range({column}, {column}, '[]') WITH =, tsrange(start_time, end_time) WITH &&"
+            ') WHERE ({column} IS NOT NULL)'.format(column=column)
+        )
+
+
+def downgrade():
+    for column in reversed(OWNER_COLUMNS):
+        op.drop_constraint('Show_{}_during_excl'.format(column), 'Show')
+    op.drop_constraint('Show_end_time_check', 'Show')
+    op.drop_column('Show', 'end_time')
@@ -0,0 +1,35 @@
+"""search indexes
+
+Revision ID: c067743db260
+Revises: 7d35235ac122
+Create Date: 2026-10-18 10:03:27.118406
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c067743db260'
+down_revision = '7d35235ac122'
+branch_labels = None
+depends_on = None
+
+# Must stay identical to search.search_document() so the planner matches it.
+SEARCH_DOCUMENT = (
+    "(((((COALESCE(name, '') || ' ') || COALESCE(city, '')) || ' ') "
+    "|| COALESCE(state, '')) || ' ') || COALESCE(genres, '')"
+)
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.execute(
+            'CREATE INDEX "ix_{table}_search_trgm" ON "{table}" '
+            'USING gin (({document}) gin_trgm_ops)'.format(table=table, document=SEARCH_DOCUMENT)
+        )
+
+
+def downgrade():
+    op.drop_index('ix_Artist_search_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_search_trgm', table_name='Venue')
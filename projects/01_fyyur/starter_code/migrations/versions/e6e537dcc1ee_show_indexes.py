@@ -0,0 +1,27 @@
+"""show indexes
+
+Revision ID: e6e537dcc1ee
+Revises: 18e1eda4bfc7
+Create Date: 2026-10-18 13:40:51.207735
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6e537dcc1ee'
+down_revision = '18e1eda4bfc7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
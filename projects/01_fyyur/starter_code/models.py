@@ -1,17 +1,54 @@
+from datetime import datetime, timedelta
+
 from app import db
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+class Genre(db.Model):
+  __tablename__ = 'Genre'
+
+  id = db.Column(db.Integer, primary_key = True)
+  name = db.Column(db.String(120), nullable = False, unique = True)
+
+  @classmethod
+  def get_or_create_all(cls, names):
+    names = [name.strip() for name in names if name and name.strip()]
+    names = list(dict.fromkeys(names))
+    if not names:
+      return []
+    genres = dict((genre.name, genre) for genre in cls.query.filter(cls.name.in_(names)).all())
+    for name in names:
+      if name not in genres:
+        genres[name] = cls(name = name)
+        db.session.add(genres[name])
+    return [genres[name] for name in names]
+
+# Association tables; the (genre_id, owner_id) indexes serve genre filters.
+# Rows go with their venue or artist through ON DELETE CASCADE.
+venue_genre = db.Table('VenueGenre',
+  db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete = 'CASCADE'), primary_key = True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key = True),
+  db.Index('ix_VenueGenre_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genre = db.Table('ArtistGenre',
+  db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete = 'CASCADE'), primary_key = True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key = True),
+  db.Index('ix_ArtistGenre_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_created_at_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
-    genres = db.Column(db.String(200))
     city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    state = db.Column(db.String(120), index=True)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     website = db.Column(db.String(120))
@@ -19,38 +56,85 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean(), nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
-    past_shows = db.Column(db.String(500))
-    upcoming_shows = db.Column(db.String(500))
-    past_shows_count = db.Column(db.Integer)
-    upcoming_shows_count = db.Column(db.Integer)
-    venue_shows = db.relationship('Show', backref = 'show_venue', cascade='all,delete')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    venue_shows = db.relationship('Show', backref = 'show_venue', cascade='all,delete', passive_deletes=True)
+    venue_genres = db.relationship('Genre', secondary = venue_genre, order_by = 'Genre.name', passive_deletes=True)
+
+    @property
+    def genres(self):
+        return [genre.name for genre in self.venue_genres]
+
+    @genres.setter
+    def genres(self, names):
+        self.venue_genres = Genre.get_or_create_all(names)
 
     #COMPLETED# TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_created_at_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    state = db.Column(db.String(120), index=True)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(200))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     looking_for_venues = db.Column(db.Boolean(), nullable=False, default=False)
     looking_for_description = db.Column(db.String(500))
-    artist_shows = db.relationship('Show', backref = 'show_artist', cascade='all,delete')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    artist_shows = db.relationship('Show', backref = 'show_artist', cascade='all,delete', passive_deletes=True)
+    artist_genres = db.relationship('Genre', secondary = artist_genre, order_by = 'Genre.name', passive_deletes=True)
+
+    @property
+    def genres(self):
+        return [genre.name for genre in self.artist_genres]
+
+    @genres.setter
+    def genres(self, names):
+        self.artist_genres = Genre.get_or_create_all(names)
 
     #COMPLETED# TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
+DEFAULT_SHOW_DURATION = timedelta(hours = 2)
+
+def default_end_time(context):
+  return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION
+
 class Show(db.Model):
   __tablename__ = 'Show'
+  __table_args__ = (
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+  )
+
+  id = db.Column(db.Integer, primary_key = True)
+  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete = 'CASCADE'), nullable = False)
+  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete = 'CASCADE'), nullable = False)
+  start_time = db.Column(db.DateTime, nullable = False)
+  # On Postgres, exclusion constraints (show_schedules migration) keep the
+  # [start_time, end_time) ranges of a venue, and of an artist, from overlapping.
+  end_time = db.Column(db.DateTime, nullable = False, default = default_end_time)
+
+CHECKPOINT_ID = 1
+
+class ShowCounterCheckpoint(db.Model):
+  __tablename__ = 'ShowCounterCheckpoint'
+  __table_args__ = (
+    db.CheckConstraint('id = {}'.format(CHECKPOINT_ID), name = 'ShowCounterCheckpoint_singleton'),
+  )
 
+  # Single row: the instant the past/upcoming counters are accurate as of.
   id = db.Column(db.Integer, primary_key = True)
-  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
-  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
-  start_time = db.Column(db.DateTime, nullable = False)
\ No newline at end of file
+  rolled_at = db.Column(db.DateTime, nullable = False)
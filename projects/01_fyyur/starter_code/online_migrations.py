@@ -0,0 +1,349 @@
+import logging
+import time
+
+import click
+from alembic import op
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+#----------------------------------------------------------------------------#
+# Online migrations.
+#
+# Helpers for migration scripts that change big tables without blocking
+# the app. Every helper leaves Alembic's transaction (autocommit_block) and
+# works in short transactions of its own:
+#
+# * DDL that needs a table lock runs with a short lock_timeout and is
+#   retried, so it never sits in the lock queue holding up reads.
+# * backfill() updates rows in keyset batches, one transaction per batch,
+#   sleeping between batches. Its position is committed with every batch in
+#   the MigrationProgress table, so a rerun resumes where it stopped and
+#   `flask migration-progress` shows how far it got.
+# * Indexes are built CONCURRENTLY, constraints are added NOT VALID and
+#   validated afterwards, and NOT NULL is set through a validated CHECK,
+#   added before the last NULL rows are filled in so none can appear since.
+# * change_column_type() copies the column into a new one kept in sync by
+#   a trigger, and swaps the two in one short transaction.
+#
+# Postgres only, and not in offline (--sql) mode.
+#----------------------------------------------------------------------------#
+
+logger = logging.getLogger('alembic.online')
+
+PROGRESS_TABLE = 'MigrationProgress'
+
+LOCK_TIMEOUT = '2s'
+LOCK_ATTEMPTS = 20
+LOCK_RETRY_WAIT = 1.0
+
+# SQLSTATE of a lock_timeout expiring.
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def quote(name):
+  return '"{}"'.format(name.replace('"', '""'))
+
+
+def _connection():
+  context = op.get_context()
+  if context.as_sql:
+    raise RuntimeError('Online migrations cannot run in offline (--sql) mode.')
+  return op.get_bind()
+
+
+def _run_ddl(connection, *statements):
+  # One short transaction per call; retried while the lock is not granted.
+  script = "BEGIN; SET LOCAL lock_timeout = '{}'; {}; COMMIT;".format(LOCK_TIMEOUT, '; '.join(statements))
+  for attempt in range(1, LOCK_ATTEMPTS + 1):
+    try:
+      connection.execute(text(script))
+      return
+    except OperationalError as e:
+      connection.execute(text('ROLLBACK'))
+      if getattr(e.orig, 'pgcode', None) != LOCK_NOT_AVAILABLE or attempt == LOCK_ATTEMPTS:
+        raise
+      logger.warning('Lock not available (attempt %d of %d): %s', attempt, LOCK_ATTEMPTS, statements[0])
+      time.sleep(LOCK_RETRY_WAIT * attempt)
+
+
+def run_ddl(*statements):
+  '''
+  Runs `statements` in one transaction that gives up on any lock it cannot
+  get within LOCK_TIMEOUT, retrying up to LOCK_ATTEMPTS times.
+  '''
+  connection = _connection()
+  with op.get_context().autocommit_block():
+    _run_ddl(connection, *statements)
+
+
+def _ensure_progress_table(connection):
+  connection.execute(text('''
+    CREATE TABLE IF NOT EXISTS {} (
+      name varchar(200) PRIMARY KEY,
+      table_name varchar(200) NOT NULL,
+      last_key bigint,
+      max_key bigint,
+      rows bigint NOT NULL DEFAULT 0,
+      started_at timestamp NOT NULL DEFAULT now(),
+      updated_at timestamp NOT NULL DEFAULT now(),
+      finished_at timestamp
+    )'''.format(quote(PROGRESS_TABLE))))
+
+
+def _backfill(connection, name, table, assignments, where=None, key='id', batch_size=10000, pause=0.1):
+  return _run_batches(connection, name, table, 'UPDATE {} SET {}'.format(quote(table), assignments),
+                      where, key, batch_size, pause)
+
+
+def _run_batches(connection, name, table, change, where, key, batch_size, pause):
+  # `change` is an UPDATE ... SET or a DELETE FROM the table, without WHERE.
+  _ensure_progress_table(connection)
+  progress = quote(PROGRESS_TABLE)
+  connection.execute(text(
+    'INSERT INTO {} (name, table_name) VALUES (:name, :table) ON CONFLICT (name) DO NOTHING'.format(progress)
+  ), name=name, table=table)
+  last_key, rows, finished_at = connection.execute(text(
+    'SELECT last_key, rows, finished_at FROM {} WHERE name = :name'.format(progress)
+  ), name=name).first()
+  if finished_at is not None:
+    logger.info('%s: finished at %s, skipping', name, finished_at)
+    return rows
+
+  table_sql, key_sql = quote(table), quote(key)
+  # Rows inserted after this point are the application's to fill in (or
+  # set_not_null()'s, which runs a last pass once new rows cannot be NULL).
+  max_key = connection.execute(text('SELECT max({}) FROM {}'.format(key_sql, table_sql))).scalar()
+  connection.execute(text('UPDATE {} SET max_key = :max_key WHERE name = :name'.format(progress)),
+                     max_key=max_key, name=name)
+  next_upper = text('''
+    SELECT max({key}) FROM (
+      SELECT {key} FROM {table} WHERE {key} > :after AND {key} <= :max_key ORDER BY {key} LIMIT :limit
+    ) AS batch'''.format(key=key_sql, table=table_sql))
+  # The batch and the new position commit together, in one statement.
+  run_batch = text('''
+    WITH batch AS (
+      {change}
+      WHERE {key} > :after AND {key} <= :upper{where}
+      RETURNING 1
+    )
+    UPDATE {progress} SET last_key = :upper, rows = rows + (SELECT count(*) FROM batch), updated_at = now()
+    WHERE name = :name
+    RETURNING rows'''.format(
+      change=change, key=key_sql, progress=progress,
+      where=' AND ({})'.format(where) if where else ''))
+
+  after = last_key if last_key is not None else 0
+  if max_key is not None and after < max_key:
+    logger.info('%s: batches over %s from %s %s to %s', name, table, key, after, max_key)
+  started = time.monotonic()
+  last_report = started
+  while max_key is not None:
+    upper = connection.execute(next_upper, after=after, max_key=max_key, limit=batch_size).scalar()
+    if upper is None:
+      break
+    rows = connection.execute(run_batch, after=after, upper=upper, name=name).scalar()
+    after = upper
+    now = time.monotonic()
+    if now - last_report >= 10 or after >= max_key:
+      logger.info('%s: %d rows, %s %s of %s (%.0f%%), %.0fs', name, rows, key, after, max_key,
+                  100.0 * after / max_key if max_key else 100.0, now - started)
+      last_report = now
+    if pause:
+      time.sleep(pause)
+
+  connection.execute(text('UPDATE {} SET finished_at = now(), updated_at = now() WHERE name = :name'.format(progress)),
+                     name=name)
+  logger.info('%s: done, %d rows', name, rows)
+  return rows
+
+
+def backfill(name, table, assignments, where=None, key='id', batch_size=10000, pause=0.1):
+  '''
+  Runs `UPDATE table SET assignments` (SQL, e.g. 'a = b + 1') over the rows
+  matching `where` in batches of `batch_size` consecutive `key` values, up
+  to the largest key present when it starts, and returns the number of rows
+  updated. `name` identifies the backfill in MigrationProgress: a finished
+  backfill is skipped, an interrupted one resumes after its last batch.
+  '''
+  connection = _connection()
+  with op.get_context().autocommit_block():
+    return _backfill(connection, name, table, assignments, where, key, batch_size, pause)
+
+
+def _reset_backfill(connection, name):
+  _ensure_progress_table(connection)
+  connection.execute(text('DELETE FROM {} WHERE name = :name'.format(quote(PROGRESS_TABLE))), name=name)
+
+
+def reset_backfill(name):
+  # For downgrades: the next upgrade runs the backfill again.
+  connection = _connection()
+  with op.get_context().autocommit_block():
+    _reset_backfill(connection, name)
+
+
+def _index_state(connection, name):
+  # None when the index does not exist, else whether it is valid.
+  return connection.execute(text('''
+    SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE c.relname = :name AND pg_table_is_visible(c.oid)'''), name=name).scalar()
+
+
+def create_index_concurrently(name, table, columns, unique=False, using=None, where=None):
+  '''
+  Builds an index without blocking writes. `columns` are column names or,
+  wrapped in parentheses, expressions. An index left invalid by an
+  interrupted build is dropped and rebuilt; a valid one is kept.
+  '''
+  connection = _connection()
+  with op.get_context().autocommit_block():
+    state = _index_state(connection, name)
+    if state:
+      logger.info('Index %s already exists', name)
+      return
+    if state is not None:
+      logger.info('Dropping invalid index %s', name)
+      connection.execute(text('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(quote(name))))
+    elements = [column if column.startswith('(') else quote(column) for column in columns]
+    logger.info('Building index %s on %s', name, table)
+    connection.execute(text('CREATE {}INDEX CONCURRENTLY {} ON {}{} ({}){}'.format(
+      'UNIQUE ' if unique else '', quote(name), quote(table),
+      ' USING {}'.format(using) if using else '', ', '.join(elements),
+      ' WHERE {}'.format(where) if where else '')))
+
+
+def drop_index_concurrently(name):
+  connection = _connection()
+  with op.get_context().autocommit_block():
+    connection.execute(text('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(quote(name))))
+
+
+def _add_constraint(connection, table, name, definition, validate=True):
+  # NOT VALID only locks the table briefly; VALIDATE scans it while reads
+  # and writes carry on. A NOT VALID constraint already holds for every
+  # row written after it is added.
+  exists = connection.execute(text(
+    'SELECT 1 FROM pg_constraint WHERE conname = :name AND conrelid = CAST(:table AS regclass)'
+  ), name=name, table=quote(table)).scalar()
+  if not exists:
+    _run_ddl(connection, 'ALTER TABLE {} ADD CONSTRAINT {} {} NOT VALID'.format(quote(table), quote(name), definition))
+  if validate:
+    connection.execute(text('ALTER TABLE {} VALIDATE CONSTRAINT {}'.format(quote(table), quote(name))))
+
+
+def add_check_constraint(name, table, condition):
+  connection = _connection()
+  with op.get_context().autocommit_block():
+    _add_constraint(connection, table, name, 'CHECK ({})'.format(condition))
+
+
+def add_foreign_key(name, table, column, referred_table, referred_column='id', ondelete=None):
+  connection = _connection()
+  with op.get_context().autocommit_block():
+    _add_constraint(connection, table, name, 'FOREIGN KEY ({}) REFERENCES {} ({}){}'.format(
+      quote(column), quote(referred_table), quote(referred_column),
+      ' ON DELETE {}'.format(ondelete) if ondelete else ''))
+
+
+def set_not_null(table, column, fill=None, delete=False, key='id', batch_size=10000, pause=0.1):
+  '''
+  SET NOT NULL without a scan under an exclusive lock: Postgres 12+ skips
+  the scan when a validated CHECK (column IS NOT NULL) already proves it.
+
+  The check is added NOT VALID first, so from then on no insert or update
+  can leave the column NULL: writers that do not set it need a default
+  (see add_column()) before this runs. The rows still NULL are then set to
+  `fill` (SQL), or deleted with `delete`, in batches, and nothing written
+  meanwhile can make the validation fail. This final pass also covers the
+  rows inserted while an earlier backfill() ran.
+  '''
+  connection = _connection()
+  check = '{}_{}_not_null'.format(table, column)
+  null_rows = '{}.{} NOT NULL'.format(table, column)
+  with op.get_context().autocommit_block():
+    _add_constraint(connection, table, check, 'CHECK ({} IS NOT NULL)'.format(quote(column)), validate=False)
+    if fill is not None or delete:
+      change = 'DELETE FROM {}'.format(quote(table)) if delete else \
+        'UPDATE {} SET {} = {}'.format(quote(table), quote(column), fill)
+      _run_batches(connection, null_rows, table, change, '{} IS NULL'.format(quote(column)),
+                   key, batch_size, pause)
+    connection.execute(text('ALTER TABLE {} VALIDATE CONSTRAINT {}'.format(quote(table), quote(check))))
+    _run_ddl(connection,
+             'ALTER TABLE {} ALTER COLUMN {} SET NOT NULL'.format(quote(table), quote(column)),
+             'ALTER TABLE {} DROP CONSTRAINT {}'.format(quote(table), quote(check)))
+    _reset_backfill(connection, null_rows)
+
+
+def add_column(table, column, type_sql, default=None):
+  '''
+  Adds a nullable column, then its default for new rows; both only touch
+  the catalog. Existing rows are filled in with backfill().
+  '''
+  statements = ['ALTER TABLE {} ADD COLUMN IF NOT EXISTS {} {}'.format(quote(table), quote(column), type_sql)]
+  if default is not None:
+    statements.append('ALTER TABLE {} ALTER COLUMN {} SET DEFAULT {}'.format(quote(table), quote(column), default))
+  run_ddl(*statements)
+
+
+def change_column_type(table, column, type_sql, using=None, key='id', batch_size=10000, pause=0.1):
+  '''
+  Changes the type of `column` without rewriting the table under a lock.
+  A new column is added and kept equal to `using` (an expression with {}
+  standing for the old column, by default a plain cast) by a trigger,
+  existing rows are backfilled in batches, and the columns are swapped and
+  the old one dropped in one short transaction. Defaults, indexes and constraints
+  on the column are not carried over; recreate them afterwards.
+  '''
+  connection = _connection()
+  new_column = column + '__new'
+  function = '{}_{}_sync'.format(table, column).lower()
+  using = using or '{}::' + type_sql
+
+  with op.get_context().autocommit_block():
+    connection.execute(text('''
+      CREATE OR REPLACE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$
+      BEGIN
+        NEW.{new_column} := {expression};
+        RETURN NEW;
+      END $$'''.format(function=quote(function), new_column=quote(new_column), expression=using.format('NEW.' + quote(column)))))
+    _run_ddl(connection,
+             'ALTER TABLE {} ADD COLUMN IF NOT EXISTS {} {}'.format(quote(table), quote(new_column), type_sql),
+             'DROP TRIGGER IF EXISTS {} ON {}'.format(quote(function), quote(table)),
+             'CREATE TRIGGER {} BEFORE INSERT OR UPDATE ON {} FOR EACH ROW EXECUTE PROCEDURE {}()'.format(
+               quote(function), quote(table), quote(function)))
+    _backfill(connection, '{}.{} to {}'.format(table, column, type_sql), table,
+              '{} = {}'.format(quote(new_column), using.format(quote(column))), key=key, batch_size=batch_size, pause=pause)
+    _run_ddl(connection,
+             'DROP TRIGGER {} ON {}'.format(quote(function), quote(table)),
+             'ALTER TABLE {} DROP COLUMN {}'.format(quote(table), quote(column)),
+             'ALTER TABLE {} RENAME COLUMN {} TO {}'.format(quote(table), quote(new_column), quote(column)))
+    connection.execute(text('DROP FUNCTION IF EXISTS {}()'.format(quote(function))))
+
+
+@click.command('migration-progress')
+@with_appcontext
+def migration_progress_command():
+  '''Show how far the batched data migrations have got.'''
+  exists = db.session.execute(text('SELECT to_regclass(:name)'), {'name': quote(PROGRESS_TABLE)}).scalar()
+  if not exists:
+    click.echo('No batched migrations have run.')
+    return
+  rows = db.session.execute(text(
+    'SELECT name, table_name, last_key, max_key, rows, started_at, updated_at, finished_at FROM {} '
+    'ORDER BY started_at'.format(quote(PROGRESS_TABLE)))).fetchall()
+  for row in rows:
+    if row.finished_at:
+      state = 'done at {:%Y-%m-%d %H:%M:%S}'.format(row.finished_at)
+    elif row.max_key:
+      state = '{:.0f}%, last batch at {:%Y-%m-%d %H:%M:%S}'.format(
+        100.0 * (row.last_key or 0) / row.max_key, row.updated_at)
+    else:
+      state = 'started at {:%Y-%m-%d %H:%M:%S}'.format(row.started_at)
+    click.echo('{}  {}: {} rows, {}'.format(row.name, row.table_name, row.rows, state))
+
+
+def init_app(app):
+  app.cli.add_command(migration_progress_command)
@@ -0,0 +1,125 @@
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Query profiler.
+#
+# Opt-in (QUERY_PROFILING). Engine events count every statement a request
+# runs and time it; statements are grouped by fingerprint (the SQL with
+# literals and bind parameters collapsed), so a lazy load inside a loop shows
+# up as one fingerprint executed many times. Each response carries the totals
+# in X-Query-* headers, recent requests are kept for /_debug/queries, and a
+# warning is logged when a fingerprint repeats more than
+# QUERY_REPEAT_THRESHOLD times in one request.
+#----------------------------------------------------------------------------#
+
+FINGERPRINT_PATTERNS = (
+  (re.compile(r"'(?:[^']|'')*'"), '?'),
+  (re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\?'), '?'),
+  (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+  (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),
+  (re.compile(r'\s+'), ' '),
+)
+
+
+def fingerprint(statement):
+  for pattern, replacement in FINGERPRINT_PATTERNS:
+    statement = pattern.sub(replacement, statement)
+  return statement.strip()
+
+
+class QueryProfiler(object):
+  def __init__(self):
+    self.enabled = False
+    self.threshold = 5
+    self.logger = None
+    self._history = deque(maxlen=100)
+    self._history_lock = threading.Lock()
+
+  def init_app(self, app):
+    self.enabled = app.config.get('QUERY_PROFILING', False)
+    self.threshold = app.config.get('QUERY_REPEAT_THRESHOLD', 5)
+    self.logger = app.logger
+    self._history = deque(maxlen=app.config.get('QUERY_PROFILE_HISTORY', 100))
+    if not self.enabled:
+      return
+
+    if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+      event.listen(Engine, 'before_cursor_execute', self._before_execute)
+      event.listen(Engine, 'after_cursor_execute', self._after_execute)
+    app.before_request(self._start_request)
+    app.after_request(self._finish_request)
+
+  def _start_request(self):
+    g.query_profile = {'statements': 0, 'seconds': 0.0, 'fingerprints': Counter(), 'samples': {}}
+
+  def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+      context._profiler_started = time.perf_counter()
+
+  def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+    if context is None or not has_request_context():
+      return
+    profile = g.get('query_profile')
+    started = getattr(context, '_profiler_started', None)
+    if profile is None or started is None:
+      return
+    key = fingerprint(statement)
+    profile['statements'] += 1
+    profile['seconds'] += time.perf_counter() - started
+    profile['fingerprints'][key] += 1
+    profile['samples'].setdefault(key, statement)
+
+  def _finish_request(self, response):
+    profile = g.pop('query_profile', None)
+    if profile is None:
+      return response
+
+    fingerprints = profile['fingerprints']
+    max_repeat = max(fingerprints.values()) if fingerprints else 0
+    db_time_ms = round(profile['seconds'] * 1000, 3)
+    response.headers['X-Query-Count'] = str(profile['statements'])
+    response.headers['X-Query-Time-Ms'] = str(db_time_ms)
+    response.headers['X-Query-Max-Repeat'] = str(max_repeat)
+
+    repeated = [
+      {
+        'fingerprint': hashlib.sha1(key.encode('utf-8')).hexdigest()[:12],
+        'count': count,
+        'statement': profile['samples'][key]
+      }
+      for key, count in fingerprints.most_common() if count > 1
+    ]
+    for item in repeated:
+      if item['count'] > self.threshold:
+        self.logger.warning(
+          'Possible N+1: %s %s ran the same statement %d times (fingerprint %s): %s',
+          request.method, request.path, item['count'], item['fingerprint'], ' '.join(item['statement'].split()))
+
+    if not (request.endpoint or '').startswith('debug_'):
+      with self._history_lock:
+        self._history.append({
+          'method': request.method,
+          'path': request.full_path.rstrip('?'),
+          'endpoint': request.endpoint,
+          'status': response.status_code,
+          'statements': profile['statements'],
+          'db_time_ms': db_time_ms,
+          'max_repeat': max_repeat,
+          'repeated': repeated
+        })
+    return response
+
+  def recent(self):
+    with self._history_lock:
+      return list(reversed(self._history))
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,170 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+
+from app import db
+from formatting import format_datetime
+from models import Show
+
+#----------------------------------------------------------------------------#
+# Show schedules.
+#
+# A venue's (or an artist's) shows never overlap, so their [start, end)
+# intervals sorted by start also have sorted ends. A bisect on the starts
+# finds the only two intervals a new show could overlap, and a bisect on the
+# ends finds where the gaps inside a time range begin. Schedules are loaded
+# per owner on first use and kept in a bounded LRU; the exclusion
+# constraints in the database catch what a stale schedule lets through.
+#----------------------------------------------------------------------------#
+
+OWNER_KEYS = OrderedDict([
+  ('venue', Show.venue_id),
+  ('artist', Show.artist_id),
+])
+
+Booking = namedtuple('Booking', 'show_id start_time end_time')
+
+
+def conflict_message(kind, booking):
+  return 'The {} is already booked from {} to {}.'.format(
+    kind, format_datetime(booking.start_time, 'full'), format_datetime(booking.end_time, 'full'))
+
+
+class Schedule(object):
+  def __init__(self, bookings=()):
+    self.starts = []
+    self.ends = []
+    self.show_ids = []
+    for booking in bookings:
+      self.add(*booking)
+
+  def conflict(self, start_time, end_time):
+    # The booking overlapping [start_time, end_time), if any.
+    i = bisect_right(self.starts, start_time)
+    if i and self.ends[i - 1] > start_time:
+      return self.booking(i - 1)
+    if i < len(self.starts) and self.starts[i] < end_time:
+      return self.booking(i)
+    return None
+
+  def add(self, show_id, start_time, end_time):
+    # Empty intervals (legacy shows cut to nothing) can never conflict.
+    if end_time <= start_time:
+      return
+    i = bisect_right(self.starts, start_time)
+    if show_id is not None and i and self.show_ids[i - 1] == show_id:
+      return
+    self.starts.insert(i, start_time)
+    self.ends.insert(i, end_time)
+    self.show_ids.insert(i, show_id)
+
+  def booking(self, i):
+    return Booking(self.show_ids[i], self.starts[i], self.ends[i])
+
+  def gaps(self, start_time, end_time, min_length):
+    gaps = []
+    cursor = start_time
+    i = bisect_right(self.ends, start_time)
+    while i < len(self.starts) and self.starts[i] < end_time:
+      if self.starts[i] - cursor >= min_length:
+        gaps.append((cursor, self.starts[i]))
+      cursor = max(cursor, self.ends[i])
+      i += 1
+    if end_time - cursor >= min_length:
+      gaps.append((cursor, end_time))
+    return gaps
+
+
+class ShowSchedules(object):
+  '''
+  Schedule per (owner kind, owner id), loaded from the Show indexes on
+  (venue_id, start_time) and (artist_id, start_time), and reloaded after
+  the TTL.
+
+  Loads run outside the lock, so one slow load does not hold up the other
+  owners. A load in progress collects the bookings added meanwhile, and is
+  not kept if the owner's schedule was discarded meanwhile.
+  '''
+  def __init__(self, max_schedules=1000, ttl=300):
+    self.max_schedules = max_schedules
+    self.ttl = ttl
+    self._schedules = OrderedDict()
+    self._loading = {}
+    self._lock = threading.Lock()
+
+  def _get(self, kind, owner_id):
+    key = (kind, owner_id)
+    with self._lock:
+      entry = self._schedules.get(key)
+      if entry is not None and time.time() - entry[0] <= self.ttl:
+        self._schedules.move_to_end(key)
+        return entry[1]
+      load = {'added': [], 'discarded': False}
+      self._loading.setdefault(key, []).append(load)
+
+    loaded_at = time.time()
+    try:
+      rows = db.session.query(Show.id, Show.start_time, Show.end_time) \
+        .filter(OWNER_KEYS[kind] == owner_id) \
+        .order_by(Show.start_time.asc()) \
+        .all()
+    finally:
+      with self._lock:
+        loads = self._loading[key]
+        loads.remove(load)
+        if not loads:
+          del self._loading[key]
+
+    with self._lock:
+      schedule = Schedule(rows)
+      for booking in load['added']:
+        schedule.add(*booking)
+      if not load['discarded']:
+        self._schedules[key] = (loaded_at, schedule)
+        self._schedules.move_to_end(key)
+        while len(self._schedules) > self.max_schedules:
+          self._schedules.popitem(last=False)
+    return schedule
+
+  def conflict(self, venue_id, artist_id, start_time, end_time):
+    # (owner kind, Booking) of the first booking in the way, or None.
+    for kind, owner_id in (('venue', venue_id), ('artist', artist_id)):
+      schedule = self._get(kind, owner_id)
+      with self._lock:
+        booking = schedule.conflict(start_time, end_time)
+      if booking is not None:
+        return kind, booking
+    return None
+
+  def add(self, show_id, venue_id, artist_id, start_time, end_time):
+    # Only schedules already loaded (or loading) need it, the others load it later.
+    with self._lock:
+      for key in (('venue', venue_id), ('artist', artist_id)):
+        entry = self._schedules.get(key)
+        if entry is not None:
+          entry[1].add(show_id, start_time, end_time)
+        for load in self._loading.get(key, ()):
+          load['added'].append((show_id, start_time, end_time))
+
+  def open_slots(self, kind, owner_id, start_time, end_time, min_length):
+    schedule = self._get(kind, owner_id)
+    with self._lock:
+      return schedule.gaps(start_time, end_time, min_length)
+
+  def discard(self, venue_id=None, artist_id=None):
+    with self._lock:
+      for key in (('venue', venue_id), ('artist', artist_id)):
+        self._schedules.pop(key, None)
+        for load in self._loading.get(key, ()):
+          load['discarded'] = True
+
+  def clear(self):
+    with self._lock:
+      self._schedules.clear()
+      for loads in self._loading.values():
+        for load in loads:
+          load['discarded'] = True
+
+
+show_schedules = ShowSchedules()
@@ -0,0 +1,194 @@
+import threading
+from collections import defaultdict
+
+from app import db
+from models import Venue, Artist, Genre, venue_genre, artist_genre
+
+#----------------------------------------------------------------------------#
+# Search.
+#
+# Venues and artists are matched on name, city, state and genres. On Postgres
+# the match runs against a pg_trgm GIN expression index (see the
+# search_indexes and genres migrations), so ILIKE '%term%' is an index scan,
+# genres are matched through the small Genre table, and results are ranked by
+# trigram word similarity. Other backends (SQLite test runs) use an
+# in-process trigram index over the same text.
+#----------------------------------------------------------------------------#
+
+RESULTS_PER_PAGE = 20
+
+SEARCH_COLUMNS = ('name', 'city', 'state')
+
+GENRE_LINKS = {
+  Venue: (venue_genre, venue_genre.c.venue_id),
+  Artist: (artist_genre, artist_genre.c.artist_id),
+}
+
+
+def search_document(model):
+  # Must stay identical to the expression indexed by the migration.
+  document = None
+  for column_name in SEARCH_COLUMNS:
+    part = db.func.coalesce(getattr(model, column_name), db.literal_column("''"))
+    document = part if document is None else document.op('||')(db.literal_column("' '")).op('||')(part)
+  return document
+
+
+def genre_owner_ids(model, condition):
+  link_table, owner_key = GENRE_LINKS[model]
+  return db.select([owner_key]) \
+    .select_from(link_table.join(Genre, Genre.id == link_table.c.genre_id)) \
+    .where(condition)
+
+
+def escape_like(term):
+  return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def trigrams(text):
+  padded = '  ' + text.lower() + ' '
+  return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex(object):
+  # In-process fallback: trigram -> ids posting lists, built lazily from the
+  # table and dropped by invalidate() whenever a venue or artist changes.
+  def __init__(self, model):
+    self.model = model
+    self._lock = threading.Lock()
+    self._postings = None
+    self._documents = None
+
+  def invalidate(self):
+    with self._lock:
+      self._postings = None
+      self._documents = None
+
+  def _build(self):
+    columns = [self.model.id, self.model.name] + [getattr(self.model, c) for c in SEARCH_COLUMNS[1:]]
+    link_table, owner_key = GENRE_LINKS[self.model]
+    genre_names = defaultdict(list)
+    genre_rows = db.session.query(owner_key, Genre.name) \
+      .join(Genre, Genre.id == link_table.c.genre_id) \
+      .all()
+    for owner_id, genre_name in genre_rows:
+      genre_names[owner_id].append(genre_name)
+
+    postings = defaultdict(set)
+    documents = {}
+    for row in self.model.query.with_entities(*columns).all():
+      text = ' '.join([value or '' for value in row[1:]] + genre_names[row.id]).lower()
+      documents[row.id] = (row.name or '', text)
+      for gram in trigrams(text):
+        postings[gram].add(row.id)
+    self._postings = postings
+    self._documents = documents
+
+  def search(self, term):
+    term = term.lower()
+    with self._lock:
+      if self._postings is None:
+        self._build()
+      postings, documents = self._postings, self._documents
+
+    grams = trigrams(term) if len(term) >= 3 else set()
+    # Interior trigrams only: the padded edges of the term need not be word edges.
+    grams = set(gram for gram in grams if ' ' not in gram)
+    if grams:
+      candidates = None
+      for gram in sorted(grams, key=lambda g: len(postings.get(g, ()))):
+        ids = postings.get(gram)
+        if not ids:
+          return []
+        candidates = set(ids) if candidates is None else candidates & ids
+        if not candidates:
+          return []
+    else:
+      candidates = documents.keys()
+
+    ranked = []
+    for entity_id in candidates:
+      name, text = documents[entity_id]
+      if term not in text:
+        continue
+      lowered_name = name.lower()
+      if lowered_name.startswith(term):
+        rank = 3
+      elif term in lowered_name:
+        rank = 2
+      else:
+        rank = 1
+      ranked.append((-rank, len(name), lowered_name, entity_id))
+    ranked.sort()
+    return [entity_id for _, _, _, entity_id in ranked]
+
+
+fallback_indexes = {
+  Venue: TrigramIndex(Venue),
+  Artist: TrigramIndex(Artist),
+}
+
+
+def invalidate_search_index(model):
+  fallback_indexes[model].invalidate()
+
+
+def search(model, term, page=1, per_page=RESULTS_PER_PAGE):
+  term = (term or '').strip()
+  page = max(page, 1)
+  if db.engine.dialect.name == 'postgresql':
+    count, rows = _search_postgres(model, term, page, per_page)
+  else:
+    count, rows = _search_fallback(model, term, page, per_page)
+
+  return {
+    "count": count,
+    "page": page,
+    "pages": (count + per_page - 1) // per_page,
+    "data": [{
+      "id": row.id,
+      "name": row.name,
+      "num_upcoming_shows": row.upcoming_shows_count
+    } for row in rows]
+  }
+
+
+def _search_postgres(model, term, page, per_page):
+  columns = (model.id, model.name, model.upcoming_shows_count)
+  query = model.query.with_entities(*columns)
+  if term:
+    pattern = '%' + escape_like(term) + '%'
+    # A UNION of the two id sets keeps both halves on their indexes; an OR
+    # across them would force a sequential scan.
+    matching_ids = db.union(
+      db.select([model.id]).where(search_document(model).ilike(pattern, escape='\\')),
+      genre_owner_ids(model, Genre.name.ilike(pattern, escape='\\'))
+    )
+    query = query.filter(model.id.in_(matching_ids))
+
+  count = query.order_by(None).count()
+  if term:
+    rank = db.func.greatest(
+      db.func.word_similarity(term, model.name) * 2,
+      db.func.word_similarity(term, search_document(model))
+    )
+    query = query.order_by(rank.desc(), model.name.asc(), model.id.asc())
+  else:
+    query = query.order_by(model.name.asc(), model.id.asc())
+
+  rows = query.offset((page - 1) * per_page).limit(per_page).all()
+  return count, rows
+
+
+def _search_fallback(model, term, page, per_page):
+  ids = fallback_indexes[model].search(term)
+  page_ids = ids[(page - 1) * per_page:page * per_page]
+  if not page_ids:
+    return len(ids), []
+
+  rows = model.query \
+    .with_entities(model.id, model.name, model.upcoming_shows_count) \
+    .filter(model.id.in_(page_ids)) \
+    .all()
+  rows_by_id = dict((row.id, row) for row in rows)
+  return len(ids), [rows_by_id[i] for i in page_ids if i in rows_by_id]
@@ -0,0 +1,83 @@
+import os
+import unittest
+
+from app import app, db
+from cache import page_cache
+from forms import artist_choices_cache, venue_choices_cache
+from models import Venue
+
+# Runs against a scratch Postgres database, e.g.
+#   createdb fyyur_api
+#   FYYUR_TEST_DATABASE_URL=postgresql://localhost:5432/fyyur_api python test_api.py
+TEST_DATABASE_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, 'FYYUR_TEST_DATABASE_URL is not set')
+class ConditionalGetTestCase(unittest.TestCase):
+    """API responses carry an ETag and answer If-None-Match with a 304."""
+
+    @classmethod
+    def setUpClass(cls):
+        from flask_migrate import upgrade
+
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE_URL
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['CACHE_TYPE'] = 'memory'
+        page_cache.init_app(app)
+
+        with app.app_context():
+            upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+            venue = Venue(name='The Hall', city='San Francisco', state='CA', address='1 Main St', seeking_talent=False)
+            db.session.add(venue)
+            db.session.commit()
+            cls.venue_id = venue.id
+        venue_choices_cache.invalidate()
+        artist_choices_cache.invalidate()
+
+    @classmethod
+    def tearDownClass(cls):
+        page_cache.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.execute('DROP TABLE IF EXISTS alembic_version')
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.url = '/api/venues/{}'.format(self.venue_id)
+
+    def test_matching_etag_gets_a_304(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        etag = res.headers['ETag']
+
+        # The second request is answered from the page cache.
+        for _ in range(2):
+            res = self.client.get(self.url, headers={'If-None-Match': etag})
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res.data, b'')
+
+        res = self.client.get(self.url, headers={'If-None-Match': '"stale"'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['ETag'], etag)
+
+    def test_edit_changes_the_etag(self):
+        etag = self.client.get(self.url).headers['ETag']
+        res = self.client.post('/venues/bulk-edit', json={'ids': [self.venue_id], 'values': {'city': 'Oakland'}})
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertEqual(res.get_json()['data']['city'], 'Oakland')
+
+    def test_errors_have_no_etag(self):
+        res = self.client.get(self.url, query_string={'fields': 'bogus'})
+        self.assertEqual(res.status_code, 400)
+        self.assertNotIn('ETag', res.headers)
+        self.assertFalse(res.get_json()['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
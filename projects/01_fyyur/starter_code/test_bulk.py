@@ -0,0 +1,65 @@
+import unittest
+
+from app import app
+from bulk import BulkError, MAX_BULK_IDS, parse_ids, clean_values
+from models import Venue, Artist
+
+
+class ParseIdsTestCase(unittest.TestCase):
+    """The id list of a bulk request."""
+
+    def test_ids_are_integers_without_duplicates(self):
+        self.assertEqual(parse_ids([3, '1', 3, 2]), [3, 1, 2])
+
+    def test_bad_ids(self):
+        for raw_ids in (None, [], {'id': 1}, '1,2', [1, 'two'], [1, None], list(range(MAX_BULK_IDS + 1))):
+            with self.assertRaises(BulkError):
+                parse_ids(raw_ids)
+
+
+class CleanValuesTestCase(unittest.TestCase):
+    """Bulk edits follow the rules of the edit forms."""
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+
+    def assertInvalid(self, model, values, fields):
+        with self.assertRaises(BulkError) as raised:
+            clean_values(model, values)
+        self.assertEqual(sorted(raised.exception.errors), fields)
+
+    def test_valid_values(self):
+        values = {
+            'city': 'Oakland',
+            'phone': '415-555-0100',
+            'website_link': None,
+            'seeking_talent': True,
+            'genres': ['Jazz', 'Folk'],
+        }
+        self.assertEqual(clean_values(Venue, values), values)
+        self.assertEqual(clean_values(Artist, {'seeking_venue': False}), {'seeking_venue': False})
+
+    def test_malformed_values(self):
+        for values in (None, {}, ['name'], {'address': '1 Main St'}, {'seeking_venue': 'yes'},
+                       {'genres': []}, {'genres': ['Polka']}, {'name': 5}):
+            with self.assertRaises(BulkError):
+                clean_values(Artist, values)
+
+    def test_form_rules(self):
+        self.assertInvalid(Venue, {'phone': '5551234'}, ['phone'])
+        self.assertInvalid(Venue, {'city': 'x' * 121, 'facebook_link': 'not a url'}, ['city', 'facebook_link'])
+        self.assertInvalid(Artist, {'image_link': 'http://i.com/' + 'x' * 500}, ['image_link'])
+        self.assertInvalid(Artist, {'name': None}, ['name'])
+
+    def test_error_message_lists_the_fields(self):
+        with self.assertRaises(BulkError) as raised:
+            clean_values(Venue, {'website_link': 'nope', 'phone': '1'})
+        self.assertEqual(str(raised.exception), 'Invalid values: phone, website_link.')
+
+
+if __name__ == '__main__':
+    unittest.main()
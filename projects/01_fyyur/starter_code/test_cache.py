@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+import unittest
+
+from cache import PageCache, MemoryBackend, FileBackend
+
+
+def page_cache_with(backend):
+  cache = PageCache()
+  cache.backend = backend
+  cache.enabled = True
+  return cache
+
+
+class PageCacheTestCase(unittest.TestCase):
+    """Tagged pages are dropped when one of their tags is invalidated."""
+
+    def setUp(self):
+        self.cache = page_cache_with(MemoryBackend())
+
+    def cache_page(self, key, value, *tags):
+        self.cache.set(key, value, self.cache.tag_versions(tags))
+
+    def test_get_returns_the_cached_page(self):
+        self.cache_page('/venues/1?', 'venue 1', 'venues', 'venue:1')
+        self.assertEqual(self.cache.get('/venues/1?'), 'venue 1')
+        self.assertIsNone(self.cache.get('/venues/2?'))
+
+    def test_invalidate_drops_pages_with_the_tag(self):
+        self.cache_page('/venues?', 'venues', 'venues')
+        self.cache_page('/venues/1?', 'venue 1', 'venues', 'venue:1')
+        self.cache_page('/artists?', 'artists', 'artists')
+
+        self.cache.invalidate('venue:1')
+        self.assertEqual(self.cache.get('/venues?'), 'venues')
+        self.assertIsNone(self.cache.get('/venues/1?'))
+        self.assertEqual(self.cache.get('/artists?'), 'artists')
+
+        self.cache.invalidate('venues', 'artists')
+        self.assertIsNone(self.cache.get('/venues?'))
+        self.assertIsNone(self.cache.get('/artists?'))
+
+    def test_invalidate_bumps_the_tag_version(self):
+        before = self.cache.tag_versions(['venues'])
+        self.assertEqual(self.cache.tag_versions(['venues']), before)
+        self.cache.invalidate('venues')
+        self.assertNotEqual(self.cache.tag_versions(['venues']), before)
+
+    def test_versions_read_before_an_invalidation_are_stale(self):
+        # A write during rendering invalidates the page being rendered.
+        tag_versions = self.cache.tag_versions(['venues'])
+        self.cache.invalidate('venues')
+        self.cache.set('/venues?', 'venues', tag_versions)
+        self.assertIsNone(self.cache.get('/venues?'))
+
+    def test_evicted_tag_version_drops_the_page(self):
+        self.cache = page_cache_with(MemoryBackend(max_entries=3))
+        self.cache_page('/venues/1?', 'venue 1', 'venue:1')
+        # Evicts the version of venue:1, the least recently used entry.
+        self.cache_page('/venues/2?', 'venue 2', 'venue:2')
+        self.assertIsNone(self.cache.get('/venues/1?'))
+
+
+class SharedFileBackendTestCase(unittest.TestCase):
+    """Workers sharing a cache directory see each other's invalidations."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.worker = page_cache_with(FileBackend(self.directory))
+        self.other_worker = page_cache_with(FileBackend(self.directory))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_invalidation_is_shared(self):
+        self.worker.set('/artists?', 'artists', self.worker.tag_versions(['artists']))
+        self.assertEqual(self.other_worker.get('/artists?'), 'artists')
+
+        self.other_worker.invalidate('artists')
+        self.assertIsNone(self.worker.get('/artists?'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import io
+import unittest
+
+from app import app
+from importer import Importer, read_rows, row_formdata
+
+
+def rows(data, fmt):
+  return list(read_rows(io.BytesIO(data), fmt))
+
+
+class ReadRowsTestCase(unittest.TestCase):
+    """Parsing CSV and JSON Lines into rows and per-row errors."""
+
+    def test_csv(self):
+        self.assertEqual(rows(b'name,city\nThe Hall,SF\nBad \xe9 Hall,SF\n', 'csv'), [
+            ({'name': 'The Hall', 'city': 'SF'}, None),
+            (None, 'Invalid UTF-8.'),
+        ])
+
+    def test_jsonl(self):
+        parsed = rows(b'{"name": "The Band"}\n\n[1, 2]\n{"name": \n{"name": "Bad \xff"}\n', 'jsonl')
+        self.assertEqual(parsed[0], ({'name': 'The Band'}, None))
+        self.assertEqual(parsed[1], (None, None))
+        self.assertEqual(parsed[2], (None, 'Expected a JSON object, got: [1, 2]'))
+        self.assertIsNone(parsed[3][0])
+        self.assertTrue(parsed[3][1].startswith('Invalid JSON: '))
+        self.assertEqual(parsed[4], (None, 'Invalid UTF-8.'))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            rows(b'', 'xml')
+
+
+class RowFormdataTestCase(unittest.TestCase):
+    """Turning a parsed row into form data."""
+
+    def test_genres_and_booleans(self):
+        formdata = row_formdata({'genres': 'Jazz, Folk', 'seeking_venue': 'no', 'seeking_talent': 'yes', 'phone': None})
+        self.assertEqual(formdata.getlist('genres'), ['Jazz', 'Folk'])
+        self.assertNotIn('seeking_venue', formdata)
+        self.assertEqual(formdata.get('seeking_talent'), 'y')
+        self.assertNotIn('phone', formdata)
+
+    def test_bad_genres(self):
+        for genres in (5, [1, {'a': 2}]):
+            with self.assertRaises(ValueError):
+                row_formdata({'genres': genres})
+
+
+class ImporterErrorTestCase(unittest.TestCase):
+    """Rows that fail are reported by number and nothing is imported."""
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            Importer('genres')
+
+    def test_error_rows(self):
+        data = (
+            b'[1, 2]\n'
+            b'\n'
+            b'{"name": "Bad Genres", "city": "SF", "state": "CA", "genres": [1]}\n'
+            b'{"name": "Bad \xff", "city": "SF", "state": "CA", "genres": "Jazz"}\n'
+            b'{"city": "SF", "state": "CA", "genres": "Jazz",'
+            b' "image_link": "http://i.com/x.png", "facebook_link": "http://f.com/x"}\n'
+            b'{"name": "Bad Phone", "city": "SF", "state": "CA", "genres": "Jazz", "phone": "555",'
+            b' "image_link": "http://i.com/y.png", "facebook_link": "http://f.com/y"}\n'
+        )
+        with app.app_context():
+            report = Importer('artists').run(io.BytesIO(data), 'jsonl')
+
+        self.assertEqual(report['imported'], 0)
+        self.assertEqual(report['failed'], 5)
+        errors = dict((error['row'], error['errors']) for error in report['errors'])
+        self.assertEqual(sorted(errors), [1, 3, 4, 5, 6])
+        self.assertTrue(errors[1].startswith('Expected a JSON object'))
+        self.assertEqual(errors[3], 'genres must be a comma-separated string or a list of strings.')
+        self.assertEqual(errors[4], 'Invalid UTF-8.')
+        self.assertEqual(list(errors[5]), ['name'])
+        self.assertEqual(list(errors[6]), ['phone'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+import json
+import os
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import app, db
+from cache import page_cache
+from schedule import show_schedules
+from models import Venue, Artist, Show, Genre, venue_genre, artist_genre
+
+# Runs against a scratch Postgres database, e.g.
+#   createdb fyyur_plans
+#   FYYUR_TEST_DATABASE_URL=postgresql://localhost:5432/fyyur_plans python test_query_plans.py
+TEST_DATABASE_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+
+SEED_VENUES = 2000
+SEED_ARTISTS = 2000
+SEED_SHOWS = 20000
+
+# Pages whose purpose is to list a whole table may scan it, and tiny lookup
+# tables are cheaper to scan than to probe.
+ALLOWED_SEQ_SCANS = {
+  ('venues', 'Venue'),
+  ('artists', 'Artist'),
+}
+SMALL_TABLES = {'Genre', 'ShowCounterCheckpoint', 'alembic_version'}
+
+
+def plan_seq_scans(plan):
+  scans = []
+  if plan.get('Node Type') == 'Seq Scan':
+    scans.append(plan.get('Relation Name'))
+  for child in plan.get('Plans', []):
+    scans.extend(plan_seq_scans(child))
+  return scans
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, 'FYYUR_TEST_DATABASE_URL is not set')
+class QueryPlanTestCase(unittest.TestCase):
+    """Fails when a page's queries can only be answered with a sequential scan."""
+
+    @classmethod
+    def setUpClass(cls):
+        from flask_migrate import upgrade
+
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE_URL
+        app.config['TESTING'] = True
+        app.config['CACHE_TYPE'] = 'null'
+        page_cache.init_app(app)
+
+        with app.app_context():
+            upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+            cls.seed()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.execute('DROP TABLE IF EXISTS alembic_version')
+
+    @classmethod
+    def seed(cls):
+        rng = random.Random(1)
+        states = ['CA', 'NY', 'TX', 'WA', 'IL']
+        genre_names = ['Jazz', 'Rock n Roll', 'Blues', 'Folk', 'Funk', 'Soul']
+        db.session.execute(Genre.__table__.insert(), [{'name': name} for name in genre_names])
+        db.session.execute(Venue.__table__.insert(), [{
+            'name': 'Venue {}'.format(i),
+            'city': 'City {}'.format(i % 50),
+            'state': states[i % len(states)],
+            'address': '{} Main St'.format(i),
+            'seeking_talent': False
+        } for i in range(SEED_VENUES)])
+        db.session.execute(Artist.__table__.insert(), [{
+            'name': 'Artist {}'.format(i),
+            'city': 'City {}'.format(i % 50),
+            'state': states[i % len(states)],
+            'looking_for_venues': False
+        } for i in range(SEED_ARTISTS)])
+        db.session.execute(venue_genre.insert(), [
+            {'venue_id': i + 1, 'genre_id': i % len(genre_names) + 1} for i in range(SEED_VENUES)
+        ])
+        db.session.execute(artist_genre.insert(), [
+            {'artist_id': i + 1, 'genre_id': i % len(genre_names) + 1} for i in range(SEED_ARTISTS)
+        ])
+        # Each round of SEED_VENUES shows gets a day of its own and books every
+        # venue and artist once, so nothing trips the overlap constraints.
+        now = datetime.now()
+        days = rng.sample(range(-365, 365), SEED_SHOWS // SEED_VENUES)
+        db.session.execute(Show.__table__.insert(), [{
+            'venue_id': i % SEED_VENUES + 1,
+            'artist_id': (i + days[i // SEED_VENUES]) % SEED_ARTISTS + 1,
+            'start_time': now + timedelta(days=days[i // SEED_VENUES], hours=rng.randint(0, 21))
+        } for i in range(SEED_SHOWS)])
+        db.session.commit()
+        db.session.execute('ANALYZE')
+        db.session.commit()
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                self.statements.append((statement, parameters))
+
+        self._record = record
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', record)
+
+    def tearDown(self):
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', self._record)
+
+    def assertIndexed(self, endpoint, method, url, **kwargs):
+        del self.statements[:]
+        response = getattr(self.client, method)(url, **kwargs)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertTrue(self.statements, url)
+
+        with app.app_context():
+            connection = db.engine.raw_connection()
+            try:
+                cursor = connection.cursor()
+                # Only a missing index leaves the planner with a sequential scan.
+                cursor.execute('SET enable_seqscan = off')
+                for statement, parameters in self.statements:
+                    cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    for table in plan_seq_scans(plan[0]['Plan']):
+                        if table in SMALL_TABLES or (endpoint, table) in ALLOWED_SEQ_SCANS:
+                            continue
+                        self.fail('{} {} scans "{}":\n{}'.format(method.upper(), url, table, statement))
+            finally:
+                connection.rollback()
+                connection.close()
+
+    def test_home(self):
+        self.assertIndexed('index', 'get', '/')
+
+    def test_venues(self):
+        self.assertIndexed('venues', 'get', '/venues')
+
+    def test_venue_detail(self):
+        self.assertIndexed('show_venue', 'get', '/venues/7')
+
+    def test_venue_open_slots(self):
+        show_schedules.clear()
+        self.assertIndexed('venue_open_slots', 'get', '/venues/7/open-slots?min_minutes=30')
+
+    def test_venues_by_genre(self):
+        self.assertIndexed('venues_by_genre', 'get', '/venues/genres/Jazz?state=CA&upcoming=1')
+
+    def test_search_venues(self):
+        self.assertIndexed('search_venues', 'post', '/venues/search', data={'search_term': 'City 1'})
+
+    def test_artists(self):
+        self.assertIndexed('artists', 'get', '/artists')
+
+    def test_artist_detail(self):
+        self.assertIndexed('show_artist', 'get', '/artists/7')
+
+    def test_artists_by_genre(self):
+        self.assertIndexed('artists_by_genre', 'get', '/artists/genres/Jazz')
+
+    def test_search_artists(self):
+        self.assertIndexed('search_artists', 'post', '/artists/search', data={'search_term': 'Artist 12'})
+
+    def test_shows(self):
+        self.assertIndexed('shows', 'get', '/shows')
+
+    def test_shows_next_page(self):
+        after = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%dT%H:%M:%S') + '_1'
+        self.assertIndexed('shows', 'get', '/shows?after=' + after)
+
+
+    def test_api_venues(self):
+        self.assertIndexed('api.api_venues', 'get', '/api/venues?fields=id,name,genres&state=CA&after=100')
+
+    def test_api_artist(self):
+        self.assertIndexed('api.api_artist', 'get', '/api/artists/7')
+
+    def test_api_shows(self):
+        self.assertIndexed('api.api_shows', 'get', '/api/shows?venue_id=7&fields=start_time,artist_name')
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
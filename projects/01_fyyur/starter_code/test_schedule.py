@@ -0,0 +1,151 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+from app import app, db
+from cache import page_cache
+from forms import artist_choices_cache, venue_choices_cache
+from schedule import Schedule, Booking, show_schedules
+from models import Venue, Artist, Show
+
+# The booking tests run against a scratch Postgres database, e.g.
+#   createdb fyyur_schedule
+#   FYYUR_TEST_DATABASE_URL=postgresql://localhost:5432/fyyur_schedule python test_schedule.py
+TEST_DATABASE_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+
+DAY = datetime(2030, 6, 1)
+
+
+def at(hour, minute=0):
+  return DAY + timedelta(hours=hour, minutes=minute)
+
+
+class ScheduleTestCase(unittest.TestCase):
+    """The in-memory schedule of one venue or artist."""
+
+    def setUp(self):
+        self.schedule = Schedule([
+            (1, at(12), at(14)),
+            (2, at(18), at(20)),
+        ])
+
+    def test_overlap_is_a_conflict(self):
+        self.assertEqual(self.schedule.conflict(at(13), at(15)), Booking(1, at(12), at(14)))
+        self.assertEqual(self.schedule.conflict(at(17), at(21)), Booking(2, at(18), at(20)))
+        self.assertEqual(self.schedule.conflict(at(18, 30), at(19)), Booking(2, at(18), at(20)))
+
+    def test_adjacent_shows_do_not_conflict(self):
+        self.assertIsNone(self.schedule.conflict(at(14), at(18)))
+        self.assertIsNone(self.schedule.conflict(at(10), at(12)))
+
+    def test_empty_interval_is_ignored(self):
+        self.schedule.add(3, at(15), at(15))
+        self.assertIsNone(self.schedule.conflict(at(14), at(18)))
+
+    def test_add_keeps_starts_sorted(self):
+        self.schedule.add(3, at(15), at(16))
+        self.assertEqual(self.schedule.starts, [at(12), at(15), at(18)])
+        self.assertEqual(self.schedule.conflict(at(15, 30), at(17)), Booking(3, at(15), at(16)))
+
+    def test_gaps(self):
+        self.assertEqual(self.schedule.gaps(at(10), at(22), timedelta(hours=1)), [
+            (at(10), at(12)),
+            (at(14), at(18)),
+            (at(20), at(22)),
+        ])
+        self.assertEqual(self.schedule.gaps(at(13), at(19), timedelta(hours=1)), [(at(14), at(18))])
+        self.assertEqual(self.schedule.gaps(at(10), at(22), timedelta(hours=3)), [(at(14), at(18))])
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, 'FYYUR_TEST_DATABASE_URL is not set')
+class ShowBookingTestCase(unittest.TestCase):
+    """Creating shows and listing open slots through the app."""
+
+    @classmethod
+    def setUpClass(cls):
+        from flask_migrate import upgrade
+
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE_URL
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['CACHE_TYPE'] = 'null'
+        page_cache.init_app(app)
+
+        with app.app_context():
+            upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+            venue = Venue(name='The Hall', city='San Francisco', state='CA', address='1 Main St', seeking_talent=False)
+            artist = Artist(name='The Band', city='San Francisco', state='CA', looking_for_venues=False)
+            other_artist = Artist(name='The Other Band', city='Oakland', state='CA', looking_for_venues=False)
+            db.session.add_all([venue, artist, other_artist])
+            db.session.commit()
+            cls.venue_id = venue.id
+            cls.artist_id = artist.id
+            cls.other_artist_id = other_artist.id
+        venue_choices_cache.invalidate()
+        artist_choices_cache.invalidate()
+        show_schedules.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        show_schedules.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.execute('DROP TABLE IF EXISTS alembic_version')
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def create_show(self, artist_id, start_time, duration='120'):
+        return self.client.post('/shows/create', data={
+            'artist_id': str(artist_id),
+            'venue_id': str(self.venue_id),
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration': duration,
+        })
+
+    def show_count(self):
+        with app.app_context():
+            return Show.query.filter_by(venue_id=self.venue_id).count()
+
+    def test_overlapping_show_is_rejected(self):
+        self.assertEqual(self.create_show(self.artist_id, at(20)).status_code, 200)
+        count = self.show_count()
+
+        res = self.create_show(self.other_artist_id, at(21))
+        self.assertEqual(res.status_code, 409)
+        self.assertIn(b'The venue is already booked', res.data)
+        self.assertEqual(self.show_count(), count)
+
+        self.assertEqual(self.create_show(self.other_artist_id, at(22)).status_code, 200)
+        self.assertEqual(self.show_count(), count + 1)
+
+    def test_invalid_duration_is_rejected(self):
+        count = self.show_count()
+        for duration in ('-60', '0', '100000', 'long'):
+            res = self.create_show(self.artist_id, at(8), duration=duration)
+            self.assertEqual(res.status_code, 400, duration)
+        self.assertEqual(self.show_count(), count)
+
+    def test_open_slots(self):
+        self.assertEqual(self.create_show(self.artist_id, at(14), duration='60').status_code, 200)
+        res = self.client.get('/venues/{}/open-slots'.format(self.venue_id), query_string={
+            'start': at(13).isoformat(),
+            'end': at(16).isoformat(),
+        })
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['slots'], [
+            {'start_time': at(13).isoformat(), 'end_time': at(14).isoformat()},
+            {'start_time': at(15).isoformat(), 'end_time': at(16).isoformat()},
+        ])
+
+    def test_open_slots_rejects_bad_dates(self):
+        url = '/venues/{}/open-slots'.format(self.venue_id)
+        for start in ('2030-06-01T10:00:00+02:00', 'tomorrow', '2030-13-01'):
+            res = self.client.get(url, query_string={'start': start})
+            self.assertEqual(res.status_code, 400, start)
+            self.assertFalse(res.get_json()['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
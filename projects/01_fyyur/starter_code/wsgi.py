@@ -0,0 +1,41 @@
+import os
+
+from app import app, db
+from database import warm_pool, pool_stats
+
+#----------------------------------------------------------------------------#
+# WSGI entry point.
+#
+#   gunicorn wsgi:app
+#
+# Settings are read from the environment (see config.py and
+# gunicorn.conf.py). With preloading, create_app() runs once in the master:
+# templates are compiled before forking and shared by every worker, and each
+# worker opens its own connection pool in post_fork via warm_worker().
+#----------------------------------------------------------------------------#
+
+def warm_templates():
+  names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+  for name in names:
+    app.jinja_env.get_template(name)
+  return len(names)
+
+
+def create_app():
+  if not app.debug and not os.environ.get('SECRET_KEY'):
+    raise RuntimeError('SECRET_KEY must be set, every worker needs the same key.')
+  templates = warm_templates()
+  app.logger.info('Compiled %d templates', templates)
+  return app
+
+
+def warm_worker():
+  # Connections opened before the fork would be shared between processes.
+  with app.app_context():
+    db.engine.dispose()
+    warm_pool(db)
+    app.logger.info('Worker pool ready: %s', pool_stats(db))
+    db.session.remove()
+
+
+application = create_app()
@@ -2,9 +2,12 @@ import os
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
+from sqlalchemy import func
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
+from .caches import QuestionPages, CategoryMap
+from .quiz import QuizEngine
+from .search import QuestionSearch
 
 QUESTIONS_PER_PAGE = 10
 
@@ -13,92 +16,214 @@ def create_app(test_config=None):
   app = Flask(__name__)
   setup_db(app)
   
-  '''
-  @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
-  '''
-
-  '''
-  @TODO: Use the after_request decorator to set Access-Control-Allow
-  '''
-
-  '''
-  @TODO: 
-  Create an endpoint to handle GET requests 
-  for all available categories.
-  '''
-
-
-  '''
-  @TODO: 
-  Create an endpoint to handle GET requests for questions, 
-  including pagination (every 10 questions). 
-  This endpoint should return a list of questions, 
-  number of total questions, current category, categories. 
-
-  TEST: At this point, when you start the application
-  you should see questions and categories generated,
-  ten questions per page and pagination at the bottom of the screen for three pages.
-  Clicking on the page numbers should update the questions. 
-  '''
-
-  '''
-  @TODO: 
-  Create an endpoint to DELETE question using a question ID. 
-
-  TEST: When you click the trash icon next to a question, the question will be removed.
-  This removal will persist in the database and when you refresh the page. 
-  '''
-
-  '''
-  @TODO: 
-  Create an endpoint to POST a new question, 
-  which will require the question and answer text, 
-  category, and difficulty score.
-
-  TEST: When you submit a question on the "Add" tab, 
-  the form will clear and the question will appear at the end of the last page
-  of the questions list in the "List" tab.  
-  '''
-
-  '''
-  @TODO: 
-  Create a POST endpoint to get questions based on a search term. 
-  It should return any questions for whom the search term 
-  is a substring of the question. 
-
-  TEST: Search by any phrase. The questions list will update to include 
-  only question that include that string within their question. 
-  Try using the word "title" to start. 
-  '''
-
-  '''
-  @TODO: 
-  Create a GET endpoint to get questions based on category. 
-
-  TEST: In the "List" tab / main screen, clicking on one of the 
-  categories in the left column will cause only questions of that 
-  category to be shown. 
-  '''
-
-
-  '''
-  @TODO: 
-  Create a POST endpoint to get questions to play the quiz. 
-  This endpoint should take category and previous question parameters 
-  and return a random questions within the given category, 
-  if provided, and that is not one of the previous questions. 
-
-  TEST: In the "Play" tab, after a user selects "All" or a category,
-  one question at a time is displayed, the user is allowed to answer
-  and shown whether they were correct or not. 
-  '''
-
-  '''
-  @TODO: 
-  Create error handlers for all expected errors 
-  including 404 and 422. 
-  '''
-  
+  CORS(app, resources={r'/*': {'origins': '*'}})
+
+  @app.after_request
+  def after_request(response):
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PATCH,DELETE,OPTIONS')
+    return response
+
+  question_pages = QuestionPages(QUESTIONS_PER_PAGE)
+  category_map = CategoryMap()
+  quiz_engine = QuizEngine()
+  question_search = QuestionSearch(QUESTIONS_PER_PAGE)
+
+  @app.route('/categories')
+  def get_categories():
+    return jsonify({
+      'success': True,
+      'categories': category_map.get()
+    })
+
+  def keyset_page(query):
+    # One page of questions in id order, and the cursor to the next one.
+    questions = query.order_by(Question.id).limit(QUESTIONS_PER_PAGE + 1).all()
+    next_cursor = None
+    if len(questions) > QUESTIONS_PER_PAGE:
+      questions = questions[:QUESTIONS_PER_PAGE]
+      next_cursor = questions[-1].id
+    return [question.format() for question in questions], next_cursor
+
+  @app.route('/questions')
+  def get_questions():
+    # ?page=N jumps to a page through its cached first id; ?after=<id>
+    # continues from the next_cursor of the previous response.
+    after = request.args.get('after', None, type=int)
+    page = None
+    query = Question.query
+    if after is not None:
+      query = query.filter(Question.id > after)
+    else:
+      page = request.args.get('page', 1, type=int)
+      start = question_pages.page_start(page)
+      if start is None:
+        abort(404)
+      query = query.filter(Question.id >= start)
+
+    questions, next_cursor = keyset_page(query)
+
+    return jsonify({
+      'success': True,
+      'questions': questions,
+      'total_questions': question_pages.count(),
+      'categories': category_map.get(),
+      'current_category': None,
+      'page': page,
+      'next_cursor': next_cursor
+    })
+
+  @app.route('/questions/<int:question_id>', methods=['DELETE'])
+  def delete_question(question_id):
+    question = Question.query.get(question_id)
+    if question is None:
+      abort(404)
+    category = question.category
+    question.delete()
+    question_pages.invalidate()
+    quiz_engine.discard(question_id, category)
+    question_search.discard(question_id)
+
+    return jsonify({
+      'success': True,
+      'deleted': question_id
+    })
+
+  @app.route('/questions', methods=['POST'])
+  def create_question():
+    body = request.get_json(silent=True) or {}
+    if 'searchTerm' in body:
+      return search_questions(body)
+
+    try:
+      difficulty = int(body.get('difficulty'))
+      category = int(body.get('category'))
+    except (TypeError, ValueError):
+      abort(422)
+    if not body.get('question') or not body.get('answer'):
+      abort(422)
+    if category not in category_map.get():
+      abort(422)
+
+    question = Question(body['question'], body['answer'], category, difficulty)
+    question.insert()
+    question_pages.add(question.id)
+    quiz_engine.add(question.id, category)
+    question_search.add(question)
+
+    return jsonify({
+      'success': True,
+      'created': question.id,
+      'total_questions': question_pages.count()
+    })
+
+  def search_questions(body):
+    # POST /questions with a searchTerm, optionally within a category.
+    try:
+      page = int(body.get('page', 1))
+      category = int(body['category']) if body.get('category') else None
+    except (TypeError, ValueError):
+      abort(422)
+    if page < 1:
+      abort(422)
+
+    questions, total_questions = question_search.search(str(body.get('searchTerm') or ''), category, page)
+
+    return jsonify({
+      'success': True,
+      'questions': [question.format() for question in questions],
+      'total_questions': total_questions,
+      'current_category': category_map.get().get(category),
+      'page': page
+    })
+
+  @app.route('/categories/<int:category_id>/questions')
+  def get_category_questions(category_id):
+    categories = category_map.get()
+    if category_id not in categories:
+      abort(404)
+
+    # The count and the page are both ranges of the (category, id) index.
+    query = Question.query.filter(Question.category == category_id)
+    total_questions = query.count()
+    after = request.args.get('after', None, type=int)
+    if after is not None:
+      query = query.filter(Question.id > after)
+    questions, next_cursor = keyset_page(query)
+
+    return jsonify({
+      'success': True,
+      'questions': questions,
+      'total_questions': total_questions,
+      'current_category': categories[category_id],
+      'next_cursor': next_cursor
+    })
+
+  @app.route('/quizzes', methods=['POST'])
+  def play_quiz():
+    # The first round sends quiz_category (and previous_questions, if any);
+    # the next ones only the quiz_session token that round returned.
+    body = request.get_json(silent=True) or {}
+    token = body.get('quiz_session')
+    if token is not None:
+      session = quiz_engine.sessions.get(token)
+      if session is None:
+        abort(404)
+    else:
+      previous_questions = body.get('previous_questions', [])
+      quiz_category = body.get('quiz_category') or {}
+      try:
+        previous_questions = [int(question_id) for question_id in previous_questions]
+        category_id = int(quiz_category.get('id', 0))
+      except (TypeError, ValueError, AttributeError):
+        abort(422)
+      # The session keeps one bit per id up to the largest one, so ids no
+      # question has are dropped rather than sizing it. An id past the
+      # cached largest one may be a question another worker just created.
+      max_id = question_pages.max_id() or 0
+      if previous_questions and max(previous_questions) > max_id:
+        max_id = db.session.query(func.max(Question.id)).scalar() or 0
+      previous_questions = [question_id for question_id in previous_questions if 0 < question_id <= max_id]
+
+      # Category 0 is "All".
+      category = category_id or None
+      session = quiz_engine.start(category, previous_questions)
+
+    question = quiz_engine.next_session_question(session)
+
+    return jsonify({
+      'success': True,
+      'question': question.format() if question else None,
+      'quiz_session': session.token
+    })
+
+  def error_response(status, message):
+    return jsonify({
+      'success': False,
+      'error': status,
+      'message': message
+    }), status
+
+  @app.errorhandler(400)
+  def bad_request(error):
+    return error_response(400, 'bad request')
+
+  @app.errorhandler(404)
+  def not_found(error):
+    return error_response(404, 'resource not found')
+
+  @app.errorhandler(405)
+  def method_not_allowed(error):
+    return error_response(405, 'method not allowed')
+
+  @app.errorhandler(422)
+  def unprocessable(error):
+    return error_response(422, 'unprocessable')
+
+  @app.errorhandler(500)
+  def server_error(error):
+    return error_response(500, 'internal server error')
+
   return app
 
     
\ No newline at end of file
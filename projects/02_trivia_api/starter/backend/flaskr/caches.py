@@ -0,0 +1,135 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import func
+
+from models import db, Question, Category
+
+'''
+TTLValue
+    a value built by load(), built again once older than the TTL or after
+    invalidate()
+
+The TTL bounds how long a change made by another worker process goes
+unseen. Every access holds the value's own lock, so a load holds up only
+the users of that value.
+'''
+class TTLValue(object):
+  def __init__(self, load, ttl):
+    self.load = load
+    self.ttl = ttl
+    self._value = None
+    self._loaded_at = None
+    self._lock = threading.RLock()
+
+  @contextmanager
+  def locked(self, load=True):
+    # The value with its lock held; None when not loaded and not `load`.
+    with self._lock:
+      if load and (self._loaded_at is None or time.time() - self._loaded_at > self.ttl):
+        self._value = self.load()
+        self._loaded_at = time.time()
+      yield self._value
+
+  def get(self):
+    with self.locked() as value:
+      return value
+
+  def invalidate(self):
+    with self._lock:
+      self._value = None
+      self._loaded_at = None
+
+
+'''
+QuestionPages
+    the first question id of every page, the question count and the
+    largest id
+
+Pages are read with a keyset query (id >= first id of the page, ordered by
+id, LIMIT per page) on the primary key index, so page 300 costs the same
+as page 1, and the count comes from here instead of a COUNT(*) per request.
+The boundaries are loaded in one pass over the primary key index. New
+questions extend them in place; a deleted question shifts every later page,
+so it drops them to be reloaded.
+'''
+class QuestionPages(object):
+  def __init__(self, per_page, ttl=60):
+    self.per_page = per_page
+    self._pages = TTLValue(self._load, ttl)
+
+  def _load(self):
+    numbered = db.session.query(
+      Question.id.label('id'),
+      func.row_number().over(order_by=Question.id).label('n'),
+      func.count().over().label('total'),
+      func.max(Question.id).over().label('max_id')
+    ).subquery()
+    rows = db.session.query(numbered.c.id, numbered.c.total, numbered.c.max_id) \
+      .filter((numbered.c.n - 1) % self.per_page == 0) \
+      .order_by(numbered.c.id) \
+      .all()
+    return {
+      'starts': [row.id for row in rows],
+      'count': rows[0].total if rows else 0,
+      'max_id': rows[0].max_id if rows else None
+    }
+
+  def count(self):
+    return self._pages.get()['count']
+
+  def max_id(self):
+    # Largest question id, or None when there are no questions.
+    return self._pages.get()['max_id']
+
+  def page_count(self):
+    return len(self._pages.get()['starts'])
+
+  def page_start(self, page):
+    # First question id of a page (1-based), or None past the last page.
+    # Page 1 always exists, empty when there are no questions.
+    with self._pages.locked() as pages:
+      starts = pages['starts']
+      if page == 1 and not starts:
+        return 0
+      if page < 1 or page > len(starts):
+        return None
+      return starts[page - 1]
+
+  def add(self, question_id):
+    with self._pages.locked(load=False) as pages:
+      if pages is None:
+        return
+      if pages['max_id'] is not None and question_id <= pages['max_id']:
+        self._pages.invalidate()
+        return
+      if pages['count'] % self.per_page == 0:
+        pages['starts'].append(question_id)
+      pages['count'] += 1
+      pages['max_id'] = question_id
+
+  def invalidate(self):
+    self._pages.invalidate()
+
+
+'''
+CategoryMap
+    {id: type} of every category, held in memory
+
+Categories are fixed reference data, so the map is loaded once and then
+only reloaded after the TTL.
+'''
+class CategoryMap(object):
+  def __init__(self, ttl=300):
+    self._types = TTLValue(self._load, ttl)
+
+  def _load(self):
+    rows = db.session.query(Category.id, Category.type).order_by(Category.id).all()
+    return {row.id: row.type for row in rows}
+
+  def get(self):
+    return dict(self._types.get())
+
+  def invalidate(self):
+    self._types.invalidate()
@@ -0,0 +1,260 @@
+import functools
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from models import Question
+from .caches import TTLValue
+
+'''
+IdPool
+    question ids in an array plus their positions, so adding or removing an
+    id and drawing a random one are all constant time
+
+sample() draws uniformly among the ids not excluded without copying the
+array. While fewer than half the ids can be excluded it redraws on an
+excluded id, which takes under two draws on average. Otherwise each
+excluded id is swapped (in an overlay, the array is left as it is) into a
+tail that shrinks by one per exclusion, and the draw is made from the
+positions before the tail: O(len(exclude)) to read the exclusions and
+O(1) for the draw, whatever the size of the pool.
+'''
+class IdPool(object):
+  def __init__(self, ids=()):
+    self.ids = []
+    self.positions = {}
+    for question_id in ids:
+      self.add(question_id)
+
+  def __len__(self):
+    return len(self.ids)
+
+  def add(self, question_id):
+    if question_id in self.positions:
+      return
+    self.positions[question_id] = len(self.ids)
+    self.ids.append(question_id)
+
+  def discard(self, question_id):
+    i = self.positions.pop(question_id, None)
+    if i is None:
+      return
+    last = self.ids.pop()
+    if last != question_id:
+      self.ids[i] = last
+      self.positions[last] = i
+
+  def sample(self, exclude=()):
+    if len(exclude) * 2 < len(self.ids):
+      while True:
+        question_id = random.choice(self.ids)
+        if question_id not in exclude:
+          return question_id
+
+    view = {}
+    where = {}
+    end = len(self.ids)
+    for question_id in set(exclude):
+      i = where.get(question_id, self.positions.get(question_id))
+      if i is None:
+        continue
+      end -= 1
+      last = view.get(end, self.ids[end])
+      view[i] = last
+      where[last] = i
+      view[end] = question_id
+      where[question_id] = end
+    if end == 0:
+      return None
+    i = random.randrange(end)
+    return view.get(i, self.ids[i])
+
+
+'''
+Bitmap
+    a set of question ids, one bit per id
+
+A session that has seen a hundred questions out of ids up to 100000 holds
+12.5kB, whatever order they were seen in.
+'''
+class Bitmap(object):
+  def __init__(self, ids=()):
+    self._bits = bytearray()
+    self._count = 0
+    for question_id in ids:
+      self.add(question_id)
+
+  def __len__(self):
+    return self._count
+
+  def __contains__(self, question_id):
+    byte = question_id >> 3
+    return 0 <= byte < len(self._bits) and bool(self._bits[byte] & (1 << (question_id & 7)))
+
+  def __iter__(self):
+    for byte, bits in enumerate(self._bits):
+      if bits:
+        for bit in range(8):
+          if bits & (1 << bit):
+            yield (byte << 3) | bit
+
+  def add(self, question_id):
+    if question_id < 0 or question_id in self:
+      return
+    byte = question_id >> 3
+    if byte >= len(self._bits):
+      self._bits.extend(bytes(byte + 1 - len(self._bits)))
+    self._bits[byte] |= 1 << (question_id & 7)
+    self._count += 1
+
+
+class QuizSession(object):
+  def __init__(self, token, category, seen):
+    self.token = token
+    self.category = category
+    self.seen = seen
+
+
+'''
+QuizSessions
+    quiz sessions by token, in a bounded LRU
+
+A session keeps its category and the questions it was served, so the
+client sends its token instead of the growing previous_questions list.
+Sessions unused for the TTL are dropped, as are the least recently used
+ones beyond max_sessions; a client whose session is gone starts a new one.
+'''
+class QuizSessions(object):
+  def __init__(self, max_sessions=10000, ttl=1800):
+    self.max_sessions = max_sessions
+    self.ttl = ttl
+    self._sessions = OrderedDict()
+    self._lock = threading.Lock()
+
+  def _evict(self, now):
+    while self._sessions:
+      used_at = next(iter(self._sessions.values()))[0]
+      if len(self._sessions) <= self.max_sessions and now - used_at <= self.ttl:
+        break
+      self._sessions.popitem(last=False)
+
+  def create(self, category, previous_questions=()):
+    session = QuizSession(secrets.token_urlsafe(16), category, Bitmap(previous_questions))
+    with self._lock:
+      now = time.time()
+      self._sessions[session.token] = (now, session)
+      self._evict(now)
+    return session
+
+  def get(self, token):
+    with self._lock:
+      now = time.time()
+      self._evict(now)
+      entry = self._sessions.get(token)
+      if entry is None:
+        return None
+      self._sessions[token] = (now, entry[1])
+      self._sessions.move_to_end(token)
+      return entry[1]
+
+  def __len__(self):
+    return len(self._sessions)
+
+
+'''
+QuizEngine
+    random quiz questions per category (None for every category)
+
+A category's pool is loaded from the question ids on its first request,
+and served from then on; only requests for that category wait for the
+load. Categories larger than max_pool_size are served by a random OFFSET
+into the ids instead. Created and deleted questions update the loaded
+pools.
+'''
+class QuizEngine(object):
+  def __init__(self, max_pool_size=100000, ttl=300, sessions=None):
+    self.max_pool_size = max_pool_size
+    self.ttl = ttl
+    self.sessions = sessions if sessions is not None else QuizSessions()
+    self._pools = {}
+    self._lock = threading.Lock()
+
+  def _filter(self, query, category):
+    if category is not None:
+      query = query.filter(Question.category == category)
+    return query
+
+  def _load(self, category):
+    ids = self._filter(Question.query.with_entities(Question.id), category) \
+      .order_by(Question.id) \
+      .limit(self.max_pool_size + 1) \
+      .all()
+    if len(ids) > self.max_pool_size:
+      return None
+    return IdPool(row.id for row in ids)
+
+  def _pool(self, category, create=True):
+    # The TTLValue holding the category's IdPool (None when too large).
+    with self._lock:
+      pool = self._pools.get(category)
+      if pool is None and create:
+        pool = self._pools[category] = TTLValue(functools.partial(self._load, category), self.ttl)
+      return pool
+
+  def _random_offset(self, category, exclude):
+    query = self._filter(Question.query, category)
+    if exclude:
+      query = query.filter(~Question.id.in_(list(exclude)))
+    count = query.count()
+    if not count:
+      return None
+    return query.order_by(Question.id).offset(random.randrange(count)).first()
+
+  def next_question(self, category, exclude):
+    # A random Question of the category whose id is not in exclude (a
+    # collection of ids, or a Bitmap), or None.
+    cached = self._pool(category)
+    while True:
+      with cached.locked() as pool:
+        if pool is None:
+          break
+        question_id = pool.sample(exclude)
+      if question_id is None:
+        return None
+      question = Question.query.get(question_id)
+      if question is not None:
+        return question
+      # Deleted by another worker process since the pool was loaded.
+      with cached.locked(load=False) as pool:
+        if pool is not None:
+          pool.discard(question_id)
+    return self._random_offset(category, exclude)
+
+  def start(self, category, previous_questions=()):
+    # A new session, seeded with the questions the client already saw.
+    return self.sessions.create(category, previous_questions)
+
+  def next_session_question(self, session):
+    question = self.next_question(session.category, session.seen)
+    if question is not None:
+      session.seen.add(question.id)
+    return question
+
+  def _update(self, change, question_id, category):
+    for key in (None, category):
+      cached = self._pool(key, create=False)
+      if cached is None:
+        continue
+      with cached.locked(load=False) as pool:
+        if pool is not None:
+          change(pool, question_id)
+          if len(pool) > self.max_pool_size:
+            cached.invalidate()
+
+  def add(self, question_id, category):
+    self._update(IdPool.add, question_id, category)
+
+  def discard(self, question_id, category):
+    self._update(IdPool.discard, question_id, category)
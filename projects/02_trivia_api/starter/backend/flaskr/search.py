@@ -0,0 +1,150 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+
+from sqlalchemy import func
+
+from models import db, Question
+from .caches import TTLValue
+
+# Words as Postgres' 'simple' text search configuration splits them.
+WORD = re.compile(r'[^\W_]+')
+
+SEARCH_CONFIG = 'simple'
+
+
+def tokenize(text):
+  return [word.lower() for word in WORD.findall(text or '')]
+
+
+def search_document():
+  # Must stay the expression of the ix_questions_search index.
+  return func.to_tsvector(SEARCH_CONFIG, func.coalesce(Question.question, '') + ' ' + func.coalesce(Question.answer, ''))
+
+
+'''
+InvertedIndex
+    question ids by word, for databases without full-text search
+
+Matches and ranks the way the Postgres query does: every word of the
+term must start a word of the question or its answer, and questions
+matching more often rank first. The vocabulary is kept sorted, so the
+words a term is a prefix of are one bisect away.
+'''
+class InvertedIndex(object):
+  def __init__(self):
+    self._postings = {}
+    self._words = []
+    self._documents = {}
+
+  def __len__(self):
+    return len(self._documents)
+
+  def add(self, question_id, category, text):
+    self.discard(question_id)
+    counts = Counter(tokenize(text))
+    self._documents[question_id] = (category, counts)
+    for word in counts:
+      postings = self._postings.get(word)
+      if postings is None:
+        postings = self._postings[word] = set()
+        self._words.insert(bisect_left(self._words, word), word)
+      postings.add(question_id)
+
+  def discard(self, question_id):
+    document = self._documents.pop(question_id, None)
+    if document is None:
+      return
+    for word in document[1]:
+      postings = self._postings[word]
+      postings.discard(question_id)
+      if not postings:
+        del self._postings[word]
+        del self._words[bisect_left(self._words, word)]
+
+  def _prefixed(self, term):
+    i = bisect_left(self._words, term)
+    while i < len(self._words) and self._words[i].startswith(term):
+      yield self._words[i]
+      i += 1
+
+  def search(self, terms, category=None):
+    # Ids of the matching questions, best first.
+    scores = None
+    for term in terms:
+      matched = Counter()
+      for word in self._prefixed(term):
+        for question_id in self._postings[word]:
+          matched[question_id] += self._documents[question_id][1][word]
+      if scores is None:
+        scores = matched
+      else:
+        scores = Counter({question_id: scores[question_id] + score
+                          for question_id, score in matched.items() if question_id in scores})
+      if not scores:
+        return []
+    if category is not None:
+      scores = {question_id: score for question_id, score in scores.items()
+                if self._documents[question_id][0] == category}
+    return sorted(scores, key=lambda question_id: (-scores[question_id], question_id))
+
+
+'''
+QuestionSearch
+    ranked, paginated question search, optionally within a category
+
+On Postgres it is a prefix tsquery against the GIN index on the question
+and answer text (ix_questions_search), ranked by ts_rank_cd. Elsewhere
+(SQLite) it is an InvertedIndex loaded on the first search, which created
+and deleted questions update.
+'''
+class QuestionSearch(object):
+  def __init__(self, per_page, ttl=300):
+    self.per_page = per_page
+    self._index = TTLValue(self._load, ttl)
+
+  def search(self, term, category=None, page=1):
+    # (questions of the page, total number of matches)
+    terms = tokenize(term)
+    if not terms:
+      return [], 0
+    if db.engine.dialect.name == 'postgresql':
+      return self._search_database(terms, category, page)
+    return self._search_index(terms, category, page)
+
+  def _search_database(self, terms, category, page):
+    document = search_document()
+    query = func.to_tsquery(SEARCH_CONFIG, ' & '.join(term + ':*' for term in terms))
+    matches = Question.query.filter(document.op('@@')(query))
+    if category is not None:
+      matches = matches.filter(Question.category == category)
+    total = matches.count()
+    questions = matches.order_by(func.ts_rank_cd(document, query).desc(), Question.id) \
+      .offset((page - 1) * self.per_page) \
+      .limit(self.per_page) \
+      .all()
+    return questions, total
+
+  def _search_index(self, terms, category, page):
+    with self._index.locked() as index:
+      ids = index.search(terms, category)
+    page_ids = ids[(page - 1) * self.per_page:page * self.per_page]
+    questions = {question.id: question for question in Question.query.filter(Question.id.in_(page_ids))}
+    return [questions[question_id] for question_id in page_ids if question_id in questions], len(ids)
+
+  def _load(self):
+    index = InvertedIndex()
+    rows = db.session.query(Question.id, Question.category, Question.question, Question.answer).all()
+    for row in rows:
+      index.add(row.id, row.category, '{} {}'.format(row.question or '', row.answer or ''))
+    return index
+
+  def add(self, question):
+    with self._index.locked(load=False) as index:
+      if index is not None:
+        index.add(question.id, question.category, '{} {}'.format(question.question or '', question.answer or ''))
+
+  def discard(self, question_id):
+    with self._index.locked(load=False) as index:
+      if index is not None:
+        index.discard(question_id)
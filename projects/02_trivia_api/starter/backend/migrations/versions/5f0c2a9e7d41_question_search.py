@@ -0,0 +1,28 @@
+"""question search
+
+Revision ID: 5f0c2a9e7d41
+Revises: b279bbecb690
+Create Date: 2026-10-18 11:42:08.517203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0c2a9e7d41'
+down_revision = 'b279bbecb690'
+branch_labels = None
+depends_on = None
+
+# The expression flaskr.search.search_document() builds, so the planner
+# matches the search query against this index.
+SEARCH_DOCUMENT = "to_tsvector('simple', coalesce(question, '') || ' ' || coalesce(answer, ''))"
+
+
+def upgrade():
+    op.create_index('ix_questions_search', 'questions', [sa.text(SEARCH_DOCUMENT)], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_questions_search', table_name='questions')
@@ -0,0 +1,44 @@
+"""category foreign key
+
+Revision ID: b279bbecb690
+Revises: 
+Create Date: 2026-10-18 10:54:34.062811
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b279bbecb690'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A database restored from trivia.psql already has an integer category
+    # with a foreign key; one made by db.create_all() before this revision
+    # has a varchar category and no key. Bring either to the same schema.
+    inspector = sa.inspect(op.get_bind())
+
+    category = next(c for c in inspector.get_columns('questions') if c['name'] == 'category')
+    if not isinstance(category['type'], sa.Integer):
+        op.alter_column('questions', 'category', type_=sa.Integer(),
+                        postgresql_using="CASE WHEN category ~ '^[0-9]+$' THEN category::integer END")
+
+    if not any(fk['constrained_columns'] == ['category'] for fk in inspector.get_foreign_keys('questions')):
+        op.execute('UPDATE questions SET category = NULL WHERE category NOT IN (SELECT id FROM categories)')
+        op.create_foreign_key('category', 'questions', 'categories', ['category'], ['id'],
+                              onupdate='CASCADE', ondelete='SET NULL')
+
+    if 'ix_questions_category_id' not in {i['name'] for i in inspector.get_indexes('questions')}:
+        op.create_index('ix_questions_category_id', 'questions', ['category', 'id'])
+
+
+def downgrade():
+    # Back to the schema of the models before this revision: a varchar
+    # category with no foreign key.
+    op.drop_index('ix_questions_category_id', table_name='questions')
+    op.drop_constraint('category', 'questions', type_='foreignkey')
+    op.alter_column('questions', 'category', type_=sa.String(), postgresql_using='category::varchar')
@@ -4,6 +4,8 @@ import json
 from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
+from flaskr.quiz import IdPool, QuizEngine, QuizSessions
+from flaskr.search import InvertedIndex, tokenize
 from models import setup_db, Question, Category
 
 
@@ -29,11 +31,276 @@ class TriviaTestCase(unittest.TestCase):
         """Executed after reach test"""
         pass
 
-    """
-    TODO
-    Write at least one test for each test for successful operation and for expected errors.
-    """
+    def test_get_categories(self):
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
 
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertTrue(len(data['categories']))
+
+    def test_get_paginated_questions(self):
+        res = self.client().get('/questions?page=1')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['questions']), 10)
+        self.assertEqual(data['total_questions'], Question.query.count())
+        self.assertTrue(len(data['categories']))
+
+    def test_questions_after_cursor_match_next_page(self):
+        first = json.loads(self.client().get('/questions?page=1').data)
+        second = json.loads(self.client().get('/questions?page=2').data)
+        after = json.loads(self.client().get('/questions?after={}'.format(first['next_cursor'])).data)
+
+        self.assertEqual(first['next_cursor'], first['questions'][-1]['id'])
+        self.assertEqual(after['questions'], second['questions'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_404_requesting_beyond_last_page(self):
+        res = self.client().get('/questions?page=1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['message'], 'resource not found')
+
+    def test_first_page_without_questions_is_empty(self):
+        with self.app.app_context():
+            # Not committed: the request runs in the same session, and
+            # rolls the delete back when it ends.
+            Question.query.delete()
+            res = self.client().get('/questions?page=1')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'], [])
+        self.assertEqual(data['total_questions'], 0)
+        self.assertIsNone(data['next_cursor'])
+        self.assertTrue(Question.query.count())
+
+    def test_create_and_delete_question(self):
+        total = json.loads(self.client().get('/questions').data)['total_questions']
+        res = self.client().post('/questions', json={
+            'question': 'What is the capital of Iceland?',
+            'answer': 'Reykjavik',
+            'category': 3,
+            'difficulty': 2
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], total + 1)
+        last_page = (total + 1 + 9) // 10
+        listed = json.loads(self.client().get('/questions?page={}'.format(last_page)).data)
+        self.assertEqual(listed['questions'][-1]['id'], data['created'])
+
+        res = self.client().delete('/questions/{}'.format(data['created']))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.data)['deleted'], data['created'])
+        self.assertIsNone(Question.query.get(data['created']))
+        self.assertEqual(json.loads(self.client().get('/questions').data)['total_questions'], total)
+
+    def test_422_creating_question_without_answer(self):
+        res = self.client().post('/questions', json={'question': 'Why?', 'category': 1, 'difficulty': 1})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(data['success'])
+
+    def test_422_creating_question_in_missing_category(self):
+        total = Question.query.count()
+        res = self.client().post('/questions', json={
+            'question': 'Why?', 'answer': 'Because.', 'category': 1000, 'difficulty': 1
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(data['success'])
+        self.assertEqual(Question.query.count(), total)
+
+    def test_404_deleting_missing_question(self):
+        res = self.client().delete('/questions/100000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+
+
+    def test_get_questions_by_category(self):
+        res = self.client().get('/categories/4/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['current_category'], 'History')
+        self.assertEqual(data['total_questions'], Question.query.filter(Question.category == 4).count())
+        self.assertTrue(all(question['category'] == 4 for question in data['questions']))
+
+    def test_404_getting_questions_of_missing_category(self):
+        res = self.client().get('/categories/1000/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+
+    def test_search_questions(self):
+        res = self.client().post('/questions', json={'searchTerm': 'title'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['total_questions'])
+        self.assertTrue(all('title' in (q['question'] + ' ' + q['answer']).lower() for q in data['questions']))
+
+    def test_search_questions_within_category(self):
+        res = self.client().post('/questions', json={'searchTerm': 'caged bird', 'category': 4})
+        data = json.loads(res.data)
+
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(data['questions'][0]['answer'], 'Maya Angelou')
+        self.assertEqual(data['current_category'], 'History')
+
+        res = self.client().post('/questions', json={'searchTerm': 'caged bird', 'category': 1})
+        self.assertEqual(json.loads(res.data)['total_questions'], 0)
+
+    def test_422_searching_with_bad_page(self):
+        res = self.client().post('/questions', json={'searchTerm': 'title', 'page': 0})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(data['success'])
+
+    def test_inverted_index_matches_word_prefixes(self):
+        index = InvertedIndex()
+        index.add(1, 1, 'What is the title of the book? The Title')
+        index.add(2, 2, 'Which film was titled Apollo 13?')
+        index.add(3, 2, 'Who wrote it? Nobody')
+        index.discard(3)
+
+        self.assertEqual(index.search(tokenize('TITL')), [1, 2])
+        self.assertEqual(index.search(tokenize('titl apollo')), [2])
+        self.assertEqual(index.search(tokenize('title'), category=2), [2])
+        self.assertEqual(index.search(tokenize('book'), category=2), [])
+        self.assertEqual(index.search(tokenize('nobody')), [])
+
+    def test_play_quiz_in_category(self):
+        category_ids = [q.id for q in Question.query.filter(Question.category == 1)]
+        previous = category_ids[:-1]
+        for _ in range(2):
+            res = self.client().post('/quizzes', json={
+                'previous_questions': previous,
+                'quiz_category': {'type': 'Science', 'id': '1'}
+            })
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['question']['id'], category_ids[-1])
+
+    def test_play_quiz_ends_when_every_question_was_asked(self):
+        every_id = [q.id for q in Question.query.all()]
+        for _ in range(2):
+            res = self.client().post('/quizzes', json={
+                'previous_questions': every_id,
+                'quiz_category': {'type': 'click', 'id': 0}
+            })
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertIsNone(data['question'])
+
+    def test_422_playing_quiz_with_bad_previous_questions(self):
+        res = self.client().post('/quizzes', json={'previous_questions': 'all', 'quiz_category': {'id': 0}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(data['success'])
+
+    def test_play_quiz_drops_ids_no_question_has(self):
+        category_ids = sorted(q.id for q in Question.query.filter(Question.category == 4))
+        res = self.client().post('/quizzes', json={
+            'previous_questions': category_ids[1:] + [10 ** 9, -5],
+            'quiz_category': {'type': 'History', 'id': 4}
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], category_ids[0])
+
+    def test_play_quiz_keeps_ids_created_by_another_worker(self):
+        self.client().get('/questions')
+        with self.app.app_context():
+            # Inserted past this app's caches, as another worker would.
+            question = Question('Who wrote Hamlet?', 'Shakespeare', 4, 1)
+            question.insert()
+            question_id = question.id
+        category_ids = [q.id for q in Question.query.filter(Question.category == 4)]
+        res = self.client().post('/quizzes', json={
+            'previous_questions': category_ids,
+            'quiz_category': {'type': 'History', 'id': 4}
+        })
+        data = json.loads(res.data)
+        with self.app.app_context():
+            Question.query.get(question_id).delete()
+
+        self.assertIn(question_id, category_ids)
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(data['question'])
+
+    def test_quiz_session_never_repeats_a_question(self):
+        category_ids = set(q.id for q in Question.query.filter(Question.category == 4))
+        res = self.client().post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 4}})
+        data = json.loads(res.data)
+        token = data['quiz_session']
+        asked = [data['question']['id']]
+        while True:
+            data = json.loads(self.client().post('/quizzes', json={'quiz_session': token}).data)
+            if data['question'] is None:
+                break
+            asked.append(data['question']['id'])
+            self.assertEqual(data['quiz_session'], token)
+
+        self.assertEqual(sorted(asked), sorted(category_ids))
+
+    def test_404_playing_quiz_with_unknown_session(self):
+        res = self.client().post('/quizzes', json={'quiz_session': 'expired'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+
+    def test_quiz_sessions_expire_and_stay_bounded(self):
+        sessions = QuizSessions(max_sessions=2, ttl=60)
+        first = sessions.create('1', [3, 17])
+        second = sessions.create('1')
+        sessions.create('2')
+
+        self.assertIsNone(sessions.get(first.token))
+        self.assertEqual(len(sessions), 2)
+        self.assertEqual(list(first.seen), [3, 17])
+
+        sessions.ttl = -1
+        self.assertIsNone(sessions.get(second.token))
+        self.assertEqual(len(sessions), 0)
+
+    def test_id_pool_samples_outside_exclusions(self):
+        pool = IdPool(range(1, 11))
+        pool.discard(4)
+        pool.add(11)
+        exclude = {1, 2, 3, 5, 6, 7, 8}
+        drawn = set(pool.sample(exclude) for _ in range(200))
+
+        self.assertEqual(drawn, {9, 10, 11})
+        self.assertIsNone(pool.sample(set(range(1, 12))))
+
+    def test_quiz_engine_serves_a_cold_category_from_its_pool(self):
+        engine = QuizEngine()
+        engine._random_offset = lambda category, exclude: self.fail('served by OFFSET')
+        with self.app.app_context():
+            ids = {question.id for question in Question.query.filter(Question.category == 1)}
+            question = engine.next_question(1, ())
+
+        self.assertIn(question.id, ids)
+        self.assertEqual(len(engine._pools[1].get()), len(ids))
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
@@ -10,6 +10,7 @@ class QuizView extends Component {
     super();
     this.state = {
         quizCategory: null,
+        quizSession: null,
         previousQuestions: [], 
         showAnswer: false,
         categories: {},
@@ -52,7 +53,9 @@ class QuizView extends Component {
       type: "POST",
       dataType: 'json',
       contentType: 'application/json',
-      data: JSON.stringify({
+      data: JSON.stringify(this.state.quizSession ? {
+        quiz_session: this.state.quizSession
+      } : {
         previous_questions: previousQuestions,
         quiz_category: this.state.quizCategory
       }),
@@ -63,6 +66,7 @@ class QuizView extends Component {
       success: (result) => {
         this.setState({
           showAnswer: false,
+          quizSession: result.quiz_session,
           previousQuestions: previousQuestions,
           currentQuestion: result.question,
           guess: '',
@@ -71,6 +75,11 @@ class QuizView extends Component {
         return;
       },
       error: (error) => {
+        if (error.status === 404 && this.state.quizSession) {
+          // The session expired: start a new one from what was asked so far.
+          this.setState({quizSession: null}, this.getNextQuestion)
+          return;
+        }
         alert('Unable to load question. Please try your request again')
         return;
       }
@@ -90,6 +99,7 @@ class QuizView extends Component {
   restartGame = () => {
     this.setState({
       quizCategory: null,
+      quizSession: null,
       previousQuestions: [], 
       showAnswer: false,
       numCorrect: 0,